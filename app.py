@@ -1,32 +1,113 @@
+import cProfile
+import datetime
+import json
+import os
+import time
+
 import yaml
-from flask import Flask, jsonify, render_template, request
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    abort,
+    current_app,
+    g,
+    has_request_context,
+    jsonify,
+    make_response,
+    render_template,
+    request,
+    stream_with_context,
+)
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.local import LocalProxy
+from werkzeug.serving import is_running_from_reloader
 
-from lib import GitCommitTimes, GitProjectInfo, GitRepoCloneAndPull
+from lib import STAGE_TIMES, FileLock, GitMetaServices, GitRefreshScheduler
 
-app = Flask(__name__, static_url_path="/assets", static_folder="assets")
-settings = yaml.load(open("gitmeta.yml"), Loader=yaml.FullLoader)
-for key, value in settings.items():
-    app.config[key] = value
 
-gpi = GitProjectInfo(
-    settings["projects"], app.config["git_repo_dir"], app.config["github_organization"]
-)
-gct = GitCommitTimes(app.config["git_repo_dir"], gpi)
-grcap = GitRepoCloneAndPull(
-    settings["github_access_token"],
-    settings["github_organization"],
-)
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        endpoint = (request.endpoint or "unmatched") if has_request_context() else None
+        with STAGE_TIMES.stage("json_serialize", endpoint=endpoint):
+            return super().dumps(obj, **kwargs)
+
+
+gitmeta = Blueprint("gitmeta", __name__)
+# The routes reach the services of whichever app serves the request
+settings = LocalProxy(lambda: current_app.extensions["gitmeta"].settings)
+gpi = LocalProxy(lambda: current_app.extensions["gitmeta"].gpi)
+gct = LocalProxy(lambda: current_app.extensions["gitmeta"].gct)
+grcap = LocalProxy(lambda: current_app.extensions["gitmeta"].grcap)
+scheduler = LocalProxy(lambda: current_app.extensions["gitmeta_scheduler"])
+
+
+def create_app(settings=None, start_scheduler=True):
+    if settings is None:
+        settings = yaml.load(open("gitmeta.yml"), Loader=yaml.FullLoader)
+    app = Flask(__name__, static_url_path="/assets", static_folder="assets")
+    app.json = TimedJSONProvider(app)
+    app.config.update(settings)
+
+    services = GitMetaServices(settings)
+    # Jobs are kept in the metrics store, which every worker process shares
+    scheduler = GitRefreshScheduler(
+        services.refresh_project,
+        settings.get("refresh_workers", 1),
+        services.gct.metrics_store,
+        FileLock(os.path.join(settings["git_repo_dir"], ".scheduler.lock")),
+    )
+    for project_settings in settings["projects"]:
+        if project_settings.get("refresh_interval_minutes"):
+            scheduler.schedule(
+                project_settings["name"], project_settings["refresh_interval_minutes"]
+            )
+    app.extensions["gitmeta"] = services
+    app.extensions["gitmeta_scheduler"] = scheduler
+    app.register_blueprint(gitmeta)
+    if start_scheduler:
+        scheduler.start()
+    return app
+
+
+@gitmeta.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Profiling is opt-in, both in the settings and per request
+    if settings.get("profile_dir") and request.args.get("profile"):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+@gitmeta.after_app_request
+def stop_request_timer(response):
+    profiler = g.pop("profiler", None)
+    if profiler:
+        profiler.disable()
+        os.makedirs(settings["profile_dir"], exist_ok=True)
+        profile_file = os.path.join(
+            settings["profile_dir"], f"{request.endpoint}-{time.time():.0f}.prof"
+        )
+        profiler.dump_stats(profile_file)
+        print(f"Profile of {request.path} written to {profile_file}")
+        response.headers["X-Profile-File"] = profile_file
+    if "request_start" in g:
+        STAGE_TIMES.record(
+            "request",
+            time.perf_counter() - g.request_start,
+            endpoint=request.endpoint or "unmatched",
+        )
+    return response
 
 
-@app.route("/project/<string:project>")
+@gitmeta.route("/project/<string:project>")
 def get_project_page(project):
     try:
-        tags = gct.get_tagged_state(project)
-        # ...this is not the way
-        for repo in tags:
-            repo["clone_url"] = gpi.get_clone_url(
-                repo["name"], app.config["github_organization"]
-            )
+        # New dicts, the tagged state is shared with the cache
+        tags = [
+            dict(repo, clone_url=gpi.get_clone_url(repo["name"], settings["github_organization"]))
+            for repo in gct.get_tagged_state(project)
+        ]
     except FileNotFoundError:
         tags = []
 
@@ -37,52 +118,137 @@ def get_project_page(project):
     )
 
 
-@app.route("/get_commit_times/<string:project>")
+def get_date_range():
+    # Optional since and until query parameters, ISO dates that are both included
+    date_range = []
+    for date in [request.args.get("since"), request.args.get("until")]:
+        try:
+            # Other ISO forms such as 20231001 are accepted but given back as
+            # YYYY-MM-DD, which the store compares days and caches ranges by
+            date_range.append(date and datetime.date.fromisoformat(date).isoformat())
+        except ValueError:
+            abort(
+                make_response(
+                    {"result": "failed", "error": f"Error: {date} is not a YYYY-MM-DD date"},
+                    400,
+                )
+            )
+    return date_range
+
+
+@gitmeta.route("/get_commit_times/<string:project>")
 def get_commit_times(project):
-    labels, result = gct.get_all_commit_times(project)
+    labels, result = gct.get_all_commit_times(project, *get_date_range())
     chartjs_datasets = [
         {"label": repo["name"], "data": repo["time_brackets"]} for repo in result
     ]
     return jsonify({"dataset": chartjs_datasets, "labels": list(labels)})
 
 
-@app.route("/get_commit_weeks/<string:project>")
+@gitmeta.route("/get_commit_weeks/<string:project>")
 def get_commit_weeks(project):
     ignore_cache = request.args.get("ignore_cache", False)
-    result = gct.get_commits_over_weeks(project, ignore_cache)
+    week_labels, result = gct.get_commits_over_weeks(
+        project, ignore_cache, *get_date_range()
+    )
     chartjs_datasets = [
         {"label": repo["name"], "data": repo["week_brackets"]} for repo in result
     ]
-    week_numbers = set(
-        [label for repo in result for label in repo["week_brackets"].keys()]
-    )
-    week_numbers = list(week_numbers)
-    week_numbers.sort(key=lambda x: int(x))
-    result = {"data": chartjs_datasets, "labels": week_numbers}
+    result = {"data": chartjs_datasets, "labels": week_labels}
     return jsonify(result)
 
 
-@app.route("/get_commit_number/<string:project>")
+@gitmeta.route("/get_commit_weekdays/<string:project>")
+def get_commit_weekdays(project):
+    labels, result = gct.get_commits_per_weekday(project, *get_date_range())
+    chartjs_datasets = [
+        {"label": repo["name"], "data": repo["weekday_brackets"]} for repo in result
+    ]
+    return jsonify({"dataset": chartjs_datasets, "labels": labels})
+
+
+@gitmeta.route("/get_commit_number/<string:project>")
 def get_commit_number(project):
-    result = gct.get_number_commits(project)
-    chartjs_datasets = result
-    chartjs_datasets.sort(key=lambda x: x["number_commits"], reverse=True)
+    result = gct.get_number_commits(project, *get_date_range())
+    # Sorted into a new list, the result is shared with the cache
+    chartjs_datasets = sorted(result, key=lambda x: x["number_commits"], reverse=True)
     return jsonify(chartjs_datasets)
 
 
-@app.route("/get_project_info")
+def ndjson_response(results):
+    # One JSON document per line, sent as soon as each repo is done
+    return Response(
+        stream_with_context(json.dumps(result, default=str) + "\n" for result in results),
+        mimetype="application/x-ndjson",
+    )
+
+
+@gitmeta.route("/stream/get_commit_times/<string:project>")
+def stream_commit_times(project):
+    return ndjson_response(
+        {"label": repo["name"], "data": repo["time_brackets"]}
+        for repo in gct.iter_commit_times(project, *get_date_range())
+    )
+
+
+@gitmeta.route("/stream/get_commit_weeks/<string:project>")
+def stream_commit_weeks(project):
+    return ndjson_response(
+        {"label": repo["name"], "data": repo["week_brackets"]}
+        for repo in gct.iter_commits_over_weeks(project, *get_date_range())
+    )
+
+
+@gitmeta.route("/stream/get_required_files/<string:project>")
+def stream_required_files(project):
+    return ndjson_response(gct.iter_got_required_files(project))
+
+
+@gitmeta.route("/get_commit_days/<string:project>")
+def get_commit_days(project):
+    return jsonify(gct.get_commits_per_day(project, *get_date_range()))
+
+
+@gitmeta.route("/get_commit_authors/<string:project>")
+def get_commit_authors(project):
+    return jsonify(gct.get_commits_per_author(project, *get_date_range()))
+
+
+@gitmeta.route("/get_activity_weeks")
+def get_activity_weeks():
+    labels, result = gct.get_activity_per_week(*get_date_range())
+    chartjs_datasets = [
+        {"label": project["name"], "data": project["week_brackets"]} for project in result
+    ]
+    return jsonify({"data": chartjs_datasets, "labels": labels})
+
+
+@gitmeta.route("/get_activity_days")
+def get_activity_days():
+    return jsonify(gct.get_activity_per_day(*get_date_range()))
+
+
+@gitmeta.route("/get_authors")
+def get_authors():
+    return jsonify(gct.get_authors(*get_date_range()))
+
+
+@gitmeta.route("/get_author_activity/<string:author>")
+def get_author_activity(author):
+    return jsonify(gct.get_author_activity(author, *get_date_range()))
+
+
+@gitmeta.route("/get_project_info")
 def get_project_info():
-    project_infos = gpi.projects
-    project_expressions = [project["expression"] for project in project_infos]
     return render_template(
         "project_info.html",
         projects=settings["projects"],
         project_info=gpi.get_all_project_info(),
-        unmatched=grcap.unmatched_repos(project_expressions),
+        unmatched=gpi.get_unmatched_repos(grcap),
     )
 
 
-@app.route("/repo_details")
+@gitmeta.route("/repo_details")
 def get_repo_details():
     return render_template(
         "repo_details.html",
@@ -91,37 +257,69 @@ def get_repo_details():
     )
 
 
-@app.route("/get_unmatched_repos")
+@gitmeta.route("/get_unmatched_repos")
 def get_unmatched_repos():
-    projects = gpi.projects
-    project_expressions = [project["expression"] for project in projects]
-    return grcap.unmatched_repos(project_expressions)
+    return gpi.get_unmatched_repos(grcap)
 
 
-@app.route("/get_repos/<string:project>")
+@gitmeta.route("/get_repos/<string:project>")
 def list_repos(project):
     return jsonify(gpi.get_repos_for_project(project))
 
 
-@app.route("/get_required_files/<string:project>")
+@gitmeta.route("/get_required_files/<string:project>")
 def get_required_files(project):
     result = gct.get_got_required_files(project)
     return jsonify(result)
 
 
-@app.route("/refresh_project/<string:project>")
+@gitmeta.route("/refresh_project/<string:project>")
 def refresh_project(project):
-    try:
-        project_info = gpi.get_project_info(project)
-        if not project_info:
-            raise Exception(f"Error: project {project} not in project list")
-        update_timestamp = grcap.pull_to_dir(
-            settings["git_repo_dir"], project_info["name"], project_info["expression"]
-        )
-        update_date = gpi.convert_timestamp(update_timestamp)
-        return {"result": "success", "update_date": update_date}
-    except Exception as e:
-        return {"result": "failed", "error": str(e)}, 500
+    project_info = gpi.get_project_info(project)
+    if not project_info:
+        return {
+            "result": "failed",
+            "error": f"Error: project {project} not in project list",
+        }, 404
+    return {"result": "queued", "job": scheduler.submit(project_info["name"])}, 202
+
+
+@gitmeta.route("/refresh_status/<string:job_id>")
+def refresh_status(job_id):
+    job = scheduler.get_job(job_id)
+    if not job:
+        return {"result": "failed", "error": f"Error: unknown job {job_id}"}, 404
+    return jsonify(job)
+
+
+@gitmeta.route("/refresh_jobs")
+def refresh_jobs():
+    return jsonify(scheduler.get_jobs())
+
+
+@gitmeta.route("/cache_stats")
+def get_cache_stats():
+    return jsonify(gct.cache_handler.memory_cache.get_stats())
+
+
+@gitmeta.route("/metrics")
+def get_metrics():
+    # Every worker process counts on its own, its samples are told apart by pid
+    worker = os.getpid()
+    worker_label = STAGE_TIMES.format_labels([("worker", worker)])
+    cache_stats = gct.cache_handler.memory_cache.get_stats()
+    lines = [
+        "# TYPE gitmeta_memory_cache_hits_total counter",
+        f"gitmeta_memory_cache_hits_total{{{worker_label}}} {cache_stats['hits']}",
+        "# TYPE gitmeta_memory_cache_misses_total counter",
+        f"gitmeta_memory_cache_misses_total{{{worker_label}}} {cache_stats['misses']}",
+        "# TYPE gitmeta_memory_cache_size gauge",
+        f"gitmeta_memory_cache_size{{{worker_label}}} {cache_stats['size']}",
+    ]
+    return Response(
+        STAGE_TIMES.to_prometheus(worker=worker) + "\n".join(lines) + "\n",
+        mimetype="text/plain; version=0.0.4",
+    )
 
 
 # @app.route("/get_commit_number")
@@ -132,9 +330,13 @@ def refresh_project(project):
 #     return jsonify(chartjs_datasets)
 
 
-@app.route("/")
+@gitmeta.route("/")
 def hello_world():
     return render_template("index.html", projects=settings["projects"])
 
 
-app.run(debug=True)
+if __name__ == "__main__":
+    # The debug reloader runs this module in a watcher process as well, only the
+    # process that serves requests should run refreshes
+    app = create_app(start_scheduler=is_running_from_reloader())
+    app.run(debug=True)
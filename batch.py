@@ -0,0 +1,68 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import yaml
+
+from lib import GitMetaServices
+
+
+def refresh_project(settings_file, project, pull):
+    # Runs in its own process, with its own git subprocesses and SQLite connection
+    settings = yaml.load(open(settings_file), Loader=yaml.FullLoader)
+    services = GitMetaServices(settings)
+    start = time.perf_counter()
+    result = services.refresh_project(project, pull=pull)
+    failed = [repo["name"] for repo in result["repos"] if repo["result"] == "failed"]
+    return {"seconds": time.perf_counter() - start, "failed": failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pull and analyse every project in gitmeta.yml, so the web app "
+        "only serves precomputed metrics"
+    )
+    parser.add_argument("--settings", default="gitmeta.yml")
+    parser.add_argument("--projects", nargs="+", help="Only these projects")
+    parser.add_argument(
+        "--no-pull", dest="pull", action="store_false", help="Only analyse the repos on disk"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=os.cpu_count(), help="Projects processed at the same time"
+    )
+    args = parser.parse_args()
+
+    settings = yaml.load(open(args.settings), Loader=yaml.FullLoader)
+    projects = args.projects or [project["name"] for project in settings["projects"]]
+    unknown = set(projects) - {project["name"] for project in settings["projects"]}
+    if unknown:
+        parser.error(f"not in {args.settings}: {', '.join(sorted(unknown))}")
+    if args.pull:
+        # Lists the org once up front, the project processes read the snapshot
+        GitMetaServices(settings).org_listing.get_repos()
+
+    errors = 0
+    with ProcessPoolExecutor(max_workers=max(min(args.jobs, len(projects)), 1)) as executor:
+        futures = {
+            executor.submit(refresh_project, args.settings, project, args.pull): project
+            for project in projects
+        }
+        for future in as_completed(futures):
+            project = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                errors += 1
+                print(f"Error refreshing {project}: {e}")
+                continue
+            if result["failed"]:
+                errors += 1
+                print(f"{project}: failed to refresh {', '.join(result['failed'])}")
+            print(f"{project}: done in {result['seconds']:.1f}s")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic_org import generate_repo
+from lib import GitCommitTimes, GitProjectInfo
+
+
+def measure(gct, repo_dir):
+    tracemalloc.start()
+    start = time.perf_counter()
+    commits = gct.read_repo_commits(repo_dir)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(commits), elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Commit extraction backends on a single repo")
+    parser.add_argument("--commits", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        repo_dir = generate_repo(os.path.join(base_dir, "bench", "bench-repo"), args.commits)
+        gpi = GitProjectInfo([], base_dir, "bench-org")
+        for backend in GitCommitTimes.COMMIT_BACKENDS:
+            gct = GitCommitTimes(base_dir, gpi, backend)
+            count, elapsed, peak = measure(gct, repo_dir)
+            print(f"{backend:>10}: {count} commits in {elapsed:.2f}s, peak {peak / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from lib import (
+    ISO_WEEK,
+    ISO_YEAR,
+    LOCAL_TS,
+    WEEKDAY,
+    CommitRecord,
+    CommitTimeArrays,
+    GitCommitTimes,
+    GitMetricsStore,
+)
+
+TIMEZONES = [0, 3600, 7200, -18000, 19800]
+
+
+def synthetic_commits(repos, commits, seed=0):
+    rng = np.random.default_rng(seed)
+    repo_index = np.sort(rng.integers(0, repos, commits))
+    author_ts = rng.integers(1693526400, 1693526400 + 120 * 86400, commits)
+    tz_offset = rng.choice(TIMEZONES, commits)
+    return repo_index, author_ts, tz_offset
+
+
+def to_commit_records(repo_index, author_ts, tz_offset, repos):
+    per_repo = [[] for _ in range(repos)]
+    for n, (repo, timestamp, offset) in enumerate(zip(repo_index, author_ts, tz_offset)):
+        timezone = datetime.timezone(datetime.timedelta(seconds=int(offset)))
+        per_repo[repo].append(
+            CommitRecord(
+                str(n),
+                datetime.datetime.fromtimestamp(int(timestamp), timezone),
+                int(offset),
+                "student@example.com",
+            )
+        )
+    return per_repo
+
+
+def timed(label, function, rounds=3):
+    # The fastest round is the one least disturbed by the rest of the machine
+    elapsed = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    print(f"{label:>28}: {elapsed:.2f}s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Week, hour and weekday histograms")
+    parser.add_argument("--repos", type=int, default=300)
+    parser.add_argument("--commits", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    repo_index, author_ts, tz_offset = synthetic_commits(args.repos, args.commits)
+    names = [f"bench-team{n:03d}" for n in range(args.repos)]
+    print(f"{args.commits} commits over {args.repos} repos")
+
+    per_repo = to_commit_records(repo_index, author_ts, tz_offset, args.repos)
+
+    def python_loops():
+        # The per-commit bucketing the histograms used to do
+        for commits in per_repo:
+            week_brackets = {}
+            time_brackets = {label: 0 for label in GitCommitTimes.TIME_LABELS}
+            weekday_brackets = [0] * 7
+            for commit in commits:
+                week = commit.author_date.isocalendar()[:2]
+                week_brackets[week] = week_brackets.get(week, 0) + 1
+                time_brackets[f"{commit.author_date.hour:02d}:00"] += 1
+                weekday_brackets[commit.author_date.weekday()] += 1
+
+    python_time = timed("per-commit python loops", python_loops)
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        metrics_store = GitMetricsStore(os.path.join(base_dir, "bench.sqlite"))
+        for name, commits in zip(names, per_repo):
+            metrics_store.save_repo_commits("bench", name, {}, commits)
+
+        def sqlite_aggregates():
+            # Each histogram grouped from the commits table
+            for buckets in [f"{ISO_YEAR}, {ISO_WEEK}", f"{LOCAL_TS} / 3600 % 24", WEEKDAY]:
+                metrics_store.connection.execute(
+                    f"SELECT repo, {buckets}, COUNT(*) FROM commits WHERE project = ? "
+                    f"GROUP BY repo, {buckets}",
+                    ("bench",),
+                ).fetchall()
+
+        timed("sqlite aggregate queries", sqlite_aggregates)
+
+        def shipped():
+            # What the metrics do: weeks from the rollup, the rest with bincount
+            # on the arrays loaded from the store
+            metrics_store.week_histogram("bench")
+            arrays = CommitTimeArrays.from_local_times(
+                names, metrics_store.get_local_times("bench")
+            )
+            arrays.hour_histogram()
+            arrays.weekday_histogram()
+
+        shipped_time = timed("rollup + store load + numpy", shipped)
+
+        def ranged():
+            # A date range sums its weeks from the day rollup instead
+            metrics_store.week_histogram("bench", since="2023-10-01", until="2023-11-30")
+            arrays = CommitTimeArrays.from_local_times(
+                names, metrics_store.get_local_times("bench", None, "2023-10-01", "2023-11-30")
+            )
+            arrays.hour_histogram()
+            arrays.weekday_histogram()
+
+        timed("same, two month range", ranged)
+
+    print(f"{'speedup over python':>28}: {python_time / shipped_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import argparse
+import multiprocessing
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.synthetic_org import generate_org
+
+ENDPOINTS = [
+    "/get_commit_times/{project}",
+    "/get_commit_weeks/{project}",
+    "/get_commit_weekdays/{project}",
+    "/get_commit_number/{project}",
+    "/get_commit_days/{project}",
+    "/get_commit_authors/{project}",
+    "/get_required_files/{project}",
+    "/get_activity_weeks",
+    "/get_authors",
+]
+
+
+def serve_worker(settings, listener):
+    import logging
+
+    from werkzeug.serving import make_server
+
+    from app import create_app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app = create_app(settings, start_scheduler=False)
+    host, port = listener.getsockname()
+    make_server(host, port, app, threaded=True, fd=listener.fileno()).serve_forever()
+
+
+def start_server(settings, processes):
+    # Worker processes that each build their own app and accept on one shared
+    # socket, the way the workers of a pre-forking WSGI server do. POSIX only,
+    # elsewhere load a server started by hand with --url
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(128)
+    context = multiprocessing.get_context("fork")
+    for _ in range(processes):
+        context.Process(target=serve_worker, args=(settings, listener), daemon=True).start()
+    return f"http://127.0.0.1:{listener.getsockname()[1]}"
+
+
+def wait_until_up(base_url, timeout=30):
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        try:
+            urllib.request.urlopen(f"{base_url}/cache_stats").read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    raise TimeoutError(f"{base_url} did not come up")
+
+
+def run_load(base_url, urls, concurrency, duration):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def client(offset):
+        n = offset
+        while time.monotonic() < stop:
+            url = urls[n % len(urls)]
+            n += 1
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(base_url + url).read()
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except (urllib.error.URLError, ConnectionError) as e:
+                with lock:
+                    errors.append(f"{url}: {e}")
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0
+
+    return {
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the endpoints under concurrent load")
+    parser.add_argument("--repos", type=int, default=20)
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=5, help="Seconds per run")
+    parser.add_argument(
+        "--url", help="Load an already running server instead, e.g. one under gunicorn"
+    )
+    parser.add_argument("--project", help="Project to request from the server at --url")
+    args = parser.parse_args()
+    if args.url and not args.project:
+        parser.error("--url needs --project")
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        project = generate_org(base_dir, "load", args.repos, args.commits, tags=5)
+        urls = [url.format(project=args.project or project["name"]) for url in ENDPOINTS]
+        settings = {
+            "github_access_token": "token",
+            "github_organization": "load-org",
+            "git_repo_dir": base_dir,
+            "projects": [dict(project, required_files={"readme": "README.*"})],
+        }
+        servers = [(None, args.url)] if args.url else []
+        for processes in [] if args.url else args.processes:
+            servers.append((processes, start_server(settings, processes)))
+
+        print(f"{args.repos} repos x {args.commits} commits, {args.duration}s per run")
+        for processes, base_url in servers:
+            wait_until_up(base_url)
+            # Fills the shared store, the load is on warm caches
+            for url in urls:
+                urllib.request.urlopen(base_url + url).read()
+            label = f"{processes} processes" if processes else base_url
+            for concurrency in args.concurrency:
+                result = run_load(base_url, urls, concurrency, args.duration)
+                print(
+                    f"{label:>12}, {concurrency:3d} clients: "
+                    f"{result['requests_per_second']:8.1f} req/s  "
+                    f"p50 {result['p50_ms']:6.1f}ms  p95 {result['p95_ms']:6.1f}ms  "
+                    f"p99 {result['p99_ms']:6.1f}ms  {len(result['errors'])} errors"
+                )
+                for error in result["errors"][:3]:
+                    print(f"    {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic_org import generate_org
+from lib import GitCommitTimes, GitMetricsStore, GitProjectInfo
+
+
+def per_metric_traversal(gct, project):
+    # What the metrics did before sharing a scan: one traversal each
+    for name, repo_url in gct.get_filtered_repos(project):
+        week_brackets = {}
+        for commit in gct.read_repo_commits(repo_url):
+            week = commit.author_date.isocalendar()[:2]
+            week_brackets[week] = week_brackets.get(week, 0) + 1
+        time_brackets = {label: 0 for label in GitCommitTimes.TIME_LABELS}
+        for commit in gct.read_repo_commits(repo_url):
+            time_brackets[f"{commit.author_date.hour:02d}:00"] += 1
+        len(gct.read_repo_commits(repo_url))
+
+
+def single_pass(gct, project):
+    # One sync of every repo into the store, the metrics are queries on it
+    gct.sync_project(project, ignore_cache=True)
+    gct.metrics_store.week_histogram(project)
+    gct.metrics_store.get_local_times(project)
+    gct.metrics_store.day_histogram(project)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-metric vs single-pass commit scan")
+    parser.add_argument("--repos", type=int, default=20)
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--backend", choices=GitCommitTimes.COMMIT_BACKENDS, default="gitlog")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        project = generate_org(base_dir, "bench", args.repos, args.commits)
+        gpi = GitProjectInfo([project], base_dir, "bench-org")
+        metrics_store = GitMetricsStore(os.path.join(base_dir, "single-pass.sqlite"))
+        gct = GitCommitTimes(base_dir, gpi, args.backend, metrics_store=metrics_store)
+
+        results = {}
+        # The second single pass finds every repo indexed at its current refs
+        for label, run in [
+            ("per-metric", per_metric_traversal),
+            ("single-pass", single_pass),
+            ("resync", single_pass),
+        ]:
+            start = time.perf_counter()
+            run(gct, project["name"])
+            results[label] = time.perf_counter() - start
+            print(f"{label:>12}: {results[label]:.2f}s for {args.repos} repos x {args.commits} commits")
+        print(f"     speedup: {results['per-metric'] / results['single-pass']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.synthetic_org import DISTRIBUTIONS, generate_org
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is left out there
+    resource = None
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+METRICS = [
+    "get_all_commit_times",
+    "get_commits_over_weeks",
+    "get_commits_per_weekday",
+    "get_number_commits",
+    "get_commits_per_day",
+    "get_commits_per_author",
+    "get_tagged_state",
+    "get_got_required_files",
+]
+ENDPOINTS = [
+    "/project/{project}",
+    "/get_commit_times/{project}",
+    "/get_commit_weeks/{project}",
+    "/get_commit_weekdays/{project}",
+    "/get_commit_number/{project}",
+    "/get_commit_days/{project}",
+    "/get_commit_authors/{project}",
+    "/get_required_files/{project}",
+    "/stream/get_commit_weeks/{project}",
+]
+REQUIRED_FILES = {"readme": "README.*", "text": "file1.*"}
+# Slowdowns smaller than this are timer noise, whatever the tolerance
+MIN_SLOWDOWN = 0.01
+
+
+class SubprocessCounter:
+    # Every subprocess goes through Popen._execute_child, also those GitPython starts
+    def __init__(self):
+        self.count = 0
+        self.execute_child = subprocess.Popen._execute_child
+
+    def install(self):
+        counter = self
+
+        def execute_child(popen, *args, **kwargs):
+            counter.count += 1
+            return counter.execute_child(popen, *args, **kwargs)
+
+        subprocess.Popen._execute_child = execute_child
+
+
+class LocalOrgListing:
+    # Stands in for the GitHub listing, with the file:// remotes of the synthetic org
+    def __init__(self, repos):
+        self.repos = repos
+
+    def get_snapshot(self, allow_stale=False):
+        return {"updated": 0}
+
+    def get_repos(self, allow_stale=False):
+        return self.repos
+
+
+def peak_rss_mb():
+    if not resource:
+        return None
+    # Kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(max(own, children) / 2**20, 1)
+
+
+def project_settings(project):
+    return dict(project, required_files=REQUIRED_FILES)
+
+
+def setup_metric(env, metric):
+    from lib import GitCommitTimes, GitMetricsStore, GitProjectInfo
+
+    project = project_settings(env["project"])
+    gpi = GitProjectInfo([project], env["base_dir"], "bench-org")
+    metrics_store = GitMetricsStore(os.path.join(env["work_dir"], "metrics.sqlite"))
+    gct = GitCommitTimes(
+        env["base_dir"], gpi, workers=env["workers"], metrics_store=metrics_store
+    )
+    if metric == "sync_project":
+        return lambda: gct.sync_project(project["name"])
+    # Only the metric itself is measured, on an index that is already up to date
+    gct.sync_project(project["name"])
+    return lambda: getattr(gct, metric)(project["name"])
+
+
+def setup_pull(env, mode):
+    from lib import GitRepoCloneAndPull, OrgRepo
+
+    remotes = [
+        OrgRepo(os.path.basename(remote)[: -len(".git")], f"file://{remote}")
+        for remote in sorted(glob.glob(os.path.join(env["remote_dir"], "*.git")))
+    ]
+    grcap = GitRepoCloneAndPull(
+        "token",
+        "bench-org",
+        env["pull_workers"],
+        org_listing=LocalOrgListing(remotes),
+        project_expressions=[env["project"]["expression"]],
+        mirror=mode.endswith("mirror"),
+    )
+    target_dir = os.path.join(env["work_dir"], "pulled")
+    os.makedirs(target_dir)
+    pull = lambda: grcap.pull_to_dir(
+        target_dir, env["project"]["name"], env["project"]["expression"]
+    )
+    if mode.startswith("refresh"):
+        # Everything is cloned already, only pulls and fetches are measured
+        pull()
+    return pull
+
+
+def setup_endpoint(env, url):
+    settings = {
+        "github_access_token": "token",
+        "github_organization": "bench-org",
+        "git_repo_dir": env["base_dir"],
+        "workers": env["workers"],
+        "projects": [project_settings(env["project"])],
+    }
+    from app import create_app
+
+    flask_app = create_app(settings, start_scheduler=False)
+    client = flask_app.test_client()
+    flask_app.extensions["gitmeta"].gct.sync_project(env["project"]["name"])
+
+    def get():
+        response = client.get(url)
+        assert response.status_code == 200, f"{url}: {response.status_code}"
+        return response.get_data()
+
+    return get
+
+
+def run_case(env, kind, name, repeat):
+    setup = {"metric": setup_metric, "pull": setup_pull, "endpoint": setup_endpoint}
+    case = setup[kind](env, name)
+    counter = SubprocessCounter()
+    counter.install()
+    # The first run is the one on a cold cache, the repeats show the warm path
+    start = time.perf_counter()
+    case()
+    result = {
+        "wall_seconds": round(time.perf_counter() - start, 4),
+        "subprocesses": counter.count,
+    }
+    warm = []
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        case()
+        warm.append(time.perf_counter() - start)
+    result["warm_seconds"] = round(min(warm), 4) if warm else None
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def list_cases(project):
+    cases = [("metric", "sync_project", 1)]
+    cases += [("metric", metric, 3) for metric in METRICS]
+    cases += [("pull", mode, 1) for mode in ["clone", "clone-mirror", "refresh", "refresh-mirror"]]
+    cases += [("endpoint", url.format(project=project), 3) for url in ENDPOINTS]
+    return cases
+
+
+def generate(args, base_dir):
+    project = generate_org(
+        base_dir, "bench", args.repos, args.commits, args.tags, args.branches,
+        args.seed, args.span_days, args.distribution,
+    )
+    remote_dir = os.path.join(base_dir, "remotes")
+    os.makedirs(remote_dir)
+    for name in os.listdir(os.path.join(base_dir, project["name"])):
+        subprocess.run(
+            ["git", "clone", "-q", "--bare", os.path.join(base_dir, project["name"], name),
+             os.path.join(remote_dir, f"{name}.git")],
+            check=True,
+        )
+    return project, remote_dir
+
+
+def slower(after, before, tolerance):
+    return after - before > max(before * tolerance, MIN_SLOWDOWN)
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for case, result in results.items():
+        before = baseline["results"].get(case)
+        if not before:
+            print(f"  {case}: not in the baseline")
+            continue
+        if slower(result["wall_seconds"], before["wall_seconds"], tolerance):
+            regressions.append(
+                f"{case}: {before['wall_seconds']:.3f}s -> {result['wall_seconds']:.3f}s"
+            )
+        if result["subprocesses"] > before["subprocesses"]:
+            regressions.append(
+                f"{case}: {before['subprocesses']} -> {result['subprocesses']} subprocesses"
+            )
+        if (result["warm_seconds"] is not None and before["warm_seconds"] is not None
+                and slower(result["warm_seconds"], before["warm_seconds"], tolerance)):
+            regressions.append(
+                f"{case}: warm {before['warm_seconds']:.4f}s -> {result['warm_seconds']:.4f}s"
+            )
+        if (result["peak_rss_mb"] and before["peak_rss_mb"]
+                and result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance)):
+            regressions.append(
+                f"{case}: peak RSS {before['peak_rss_mb']} -> {result['peak_rss_mb']} MB"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time every metric, the repo pulls and the endpoints on a synthetic org"
+    )
+    parser.add_argument("--repos", type=int, default=20)
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--tags", type=int, default=5)
+    parser.add_argument("--branches", type=int, default=3)
+    parser.add_argument("--span-days", type=int, default=120)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="deadline")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--pull-workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3, help="Runs per case, the fastest counts")
+    parser.add_argument("--only", help="Only run the cases whose name contains this")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25,
+        help="Relative slowdown or memory growth that counts as a regression",
+    )
+    args = parser.parse_args()
+    params = {
+        key: getattr(args, key)
+        for key in ["repos", "commits", "tags", "branches", "span_days", "distribution",
+                    "seed", "workers", "pull_workers"]
+    }
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        project, remote_dir = generate(args, base_dir)
+        print(f"{args.repos} repos x {args.commits} commits ({args.distribution})")
+        results = {}
+        # A fresh interpreter per case, so caches and peak RSS do not carry over
+        context = multiprocessing.get_context("spawn")
+        for kind, name, repeat in list_cases(project["name"]):
+            case = f"{kind}:{name}"
+            if args.only and args.only not in case:
+                continue
+            rounds = []
+            for _ in range(args.rounds):
+                work_dir = os.path.join(base_dir, "work")
+                os.makedirs(work_dir)
+                # The app keeps its metrics in the repo dir, every case starts without it
+                for db_file in glob.glob(os.path.join(base_dir, ".gitmeta.sqlite*")):
+                    os.remove(db_file)
+                env = dict(params, project=project, base_dir=base_dir,
+                           remote_dir=remote_dir, work_dir=work_dir)
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    rounds.append(executor.submit(run_case, env, kind, name, repeat).result())
+                shutil.rmtree(work_dir, ignore_errors=True)
+            # The best round is the one least disturbed by the rest of the machine
+            result = min(rounds, key=lambda result: result["wall_seconds"])
+            results[case] = result
+            warm = result["warm_seconds"]
+            print(
+                f"  {case:<45} {result['wall_seconds']:8.3f}s "
+                f"{f'{warm:.4f}s' if warm is not None else '-':>9} warm "
+                f"{result['subprocesses']:5d} subprocesses "
+                f"{result['peak_rss_mb'] or '-':>7} MB peak"
+            )
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"params": params, "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved the baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["params"] != params:
+            print(f"The baseline was recorded with other parameters: {baseline['params']}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic_org import generate_org
+from lib import GitCommitTimes, GitMetricsStore, GitProjectInfo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per repo analysis throughput by worker count")
+    parser.add_argument("--repos", type=int, default=40)
+    parser.add_argument("--commits", type=int, default=1000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        project = generate_org(base_dir, "bench", args.repos, args.commits)
+        gpi = GitProjectInfo([project], base_dir, "bench-org")
+        print(f"{args.repos} repos x {args.commits} commits on {os.cpu_count()} cores")
+        baseline = None
+        for workers in args.workers:
+            # A fresh store per run, so every run reads all history again
+            metrics_store = GitMetricsStore(os.path.join(base_dir, f"workers-{workers}.sqlite"))
+            gct = GitCommitTimes(base_dir, gpi, workers=workers, metrics_store=metrics_store)
+            start = time.perf_counter()
+            gct.sync_project(project["name"], ignore_cache=True)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(
+                f"{workers:>2} workers: {args.repos / elapsed:7.1f} repos/s "
+                f"({elapsed:.2f}s, {baseline / elapsed:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import random
+import subprocess
+
+# Start of a fictional semester, spread commits over this many days
+DEFAULT_START = 1693526400  # 2023-09-01 00:00 UTC
+DEFAULT_SPAN_DAYS = 120
+TIMEZONES = ["+0000", "+0100", "+0200", "-0500", "+0530"]
+DISTRIBUTIONS = ["uniform", "deadline"]
+
+
+def _timestamps(commits, rng, start, span_days, distribution):
+    span = span_days * 86400
+    if distribution == "deadline":
+        # Weekly deadlines, most commits land in the last day or two before one
+        deadlines = max(span_days // 7, 1)
+        return sorted(
+            start + max(0, min(span - 1, (rng.randrange(deadlines) + 1) * 7 * 86400
+                               - int(rng.expovariate(1 / 36000))))
+            for _ in range(commits)
+        )
+    return sorted(start + rng.randrange(span) for _ in range(commits))
+
+
+def _fast_import_stream(name, commits, tags, branches, rng, start, span_days,
+                        distribution="uniform"):
+    timestamps = _timestamps(commits, rng, start, span_days, distribution)
+    authors = [f"student{n}" for n in range(rng.randint(1, 4))]
+    lines = []
+    for mark, timestamp in enumerate(timestamps, start=1):
+        author = rng.choice(authors)
+        tz = rng.choice(TIMEZONES)
+        message = f"Commit {mark} in {name}\n"
+        content = f"{name} revision {mark}\n"
+        lines.append("commit refs/heads/main")
+        lines.append(f"mark :{mark}")
+        lines.append(f"author {author} <{author}@example.com> {timestamp} {tz}")
+        lines.append(f"committer {author} <{author}@example.com> {timestamp} {tz}")
+        lines.append(f"data {len(message.encode())}")
+        lines.append(message.rstrip("\n"))
+        if mark > 1:
+            lines.append(f"from :{mark - 1}")
+        lines.append(f"M 644 inline file{mark % 10}.txt")
+        lines.append(f"data {len(content.encode())}")
+        lines.append(content.rstrip("\n"))
+        lines.append("")
+    for n in range(min(tags, commits)):
+        lines.append(f"reset refs/tags/v{n + 1}")
+        lines.append(f"from :{(n + 1) * commits // max(tags, 1)}")
+        lines.append("")
+    for n in range(min(branches, commits)):
+        lines.append(f"reset refs/heads/feature-{n + 1}")
+        lines.append(f"from :{rng.randint(1, commits)}")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def generate_repo(repo_dir, commits, tags=0, branches=0, seed=0,
+                  start=DEFAULT_START, span_days=DEFAULT_SPAN_DAYS, distribution="uniform"):
+    rng = random.Random(f"{repo_dir}:{seed}")
+    name = os.path.basename(repo_dir)
+    subprocess.run(["git", "init", "-q", "-b", "main", repo_dir], check=True)
+    if commits:
+        stream = _fast_import_stream(
+            name, commits, tags, branches, rng, start, span_days, distribution
+        )
+        subprocess.run(
+            ["git", "fast-import", "--quiet"],
+            cwd=repo_dir,
+            input=stream.encode(),
+            check=True,
+        )
+        subprocess.run(["git", "checkout", "-q", "-f", "main"], cwd=repo_dir, check=True)
+    return repo_dir
+
+
+def generate_org(base_dir, project, repos, commits, tags=0, branches=0, seed=0,
+                 span_days=DEFAULT_SPAN_DAYS, distribution="uniform"):
+    """Create `repos` local git repositories in base_dir/project, named like
+    GitHub classroom repos (project-team<n>), and return the project settings
+    the lib classes expect."""
+    project_dir = os.path.join(base_dir, project)
+    os.makedirs(project_dir, exist_ok=True)
+    for n in range(repos):
+        repo_dir = os.path.join(project_dir, f"{project}-team{n:03d}")
+        if not os.path.exists(repo_dir):
+            generate_repo(repo_dir, commits, tags, branches, seed,
+                          span_days=span_days, distribution=distribution)
+    return {"name": project, "label": project, "expression": f"{project}-"}
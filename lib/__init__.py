@@ -1,4 +1,15 @@
+from .stage_timer import *
+from .file_lock import *
+from .github_org_listing import *
 from .get_clone_and_pull_rac import *
+from .lru_cache import *
+from .git_log_reader import *
+from .commit_time_arrays import *
+from .git_metrics_store import *
 from .git_cache_handler import *
+from .git_commit_index import *
+from .git_required_files import *
 from .git_commit_times import *
 from .git_project_info import *
+from .git_refresh_scheduler import *
+from .git_meta_services import *
@@ -0,0 +1,53 @@
+import numpy as np
+
+DAY = 86400
+WEEKDAY_LABELS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def week_label(iso_year, week):
+    # Sorts as text, and weeks of different years are kept apart
+    return f"{iso_year}-W{week:02d}"
+
+
+class CommitTimeArrays:
+    # Commit times of a whole project as flat arrays, one entry per commit:
+    # the index of its repo in names and its time as seen by its author, in
+    # seconds since the epoch
+
+    def __init__(self, names, repo_index, local_ts):
+        self.names = names
+        self.repo_index = repo_index
+        self.local_ts = local_ts
+
+    @classmethod
+    def from_local_times(cls, names, rows):
+        # rows of (repo, comma separated local times), repos not in names are
+        # skipped. The text is parsed in C, no Python object per commit
+        positions = {name: n for n, name in enumerate(names)}
+        repos, times = [], []
+        for repo, text in rows:
+            if repo in positions:
+                repos.append(positions[repo])
+                times.append(np.fromstring(text, dtype=np.int64, sep=","))
+        return cls(
+            names,
+            np.repeat(np.array(repos, dtype=np.int64), [len(ts) for ts in times]),
+            np.concatenate(times) if times else np.zeros(0, dtype=np.int64),
+        )
+
+    def stacked_bincount(self, buckets, bucket_count):
+        # One bincount over all repos at once, a row per repo
+        return np.bincount(
+            self.repo_index * bucket_count + buckets,
+            minlength=len(self.names) * bucket_count,
+        ).reshape(len(self.names), bucket_count)
+
+    def counts(self):
+        return np.bincount(self.repo_index, minlength=len(self.names))
+
+    def hour_histogram(self):
+        return self.stacked_bincount(self.local_ts // 3600 % 24, 24)
+
+    def weekday_histogram(self):
+        # 1970-01-01 was a Thursday, Monday is 0
+        return self.stacked_bincount((self.local_ts // DAY + 3) % 7, 7)
@@ -0,0 +1,62 @@
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    # An exclusive lock between processes, and between threads that each use
+    # their own FileLock on the same path
+    RETRY_INTERVAL = 0.1
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def try_lock(self):
+        try:
+            if fcntl:
+                fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self.fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, blocking=True, timeout=None) -> bool:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl and blocking and timeout is None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            return True
+        start = time.monotonic()
+        while not self.try_lock():
+            if not blocking or (timeout is not None and time.monotonic() - start > timeout):
+                os.close(self.fd)
+                self.fd = None
+                return False
+            time.sleep(self.RETRY_INTERVAL)
+        return True
+
+    def release(self):
+        if self.fd is None:
+            return
+        if fcntl:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self.fd, 0, os.SEEK_SET)
+            msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        os.close(self.fd)
+        self.fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
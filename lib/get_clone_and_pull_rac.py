@@ -1,18 +1,44 @@
 import os.path
 import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import git
-from github import Github
 from git.repo.base import Repo
 
+from lib import STAGE_TIMES, FileLock, GitHubOrgListing
+
 
 class GitRepoCloneAndPull:
     LAST_UPDATE_FILE = ".last_update"
+    # Branches and tags are all the analytics read, pull requests and the like are skipped
+    MIRROR_REFSPECS = ["+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"]
 
-    def __init__(self, github_access_token, github_org):
+    def __init__(
+        self,
+        github_access_token,
+        github_org,
+        workers=1,
+        timeout=None,
+        org_listing=None,
+        project_expressions=None,
+        mirror=False,
+    ):
         self.github_access_token = github_access_token
         self.github_org = github_org
-        self.repo_list = self.list_all_repos()
+        self.org_listing = org_listing or GitHubOrgListing(
+            github_access_token, github_org
+        )
+        # Clones and fetches are network bound, a few more workers than cores is fine
+        self.workers = workers
+        self.timeout = timeout
+        # Mirrors are bare partial clones: commits and trees, blobs only on demand
+        self.mirror = mirror
+        self.project_expressions = list(project_expressions or [])
+        self.assignments = {}
+        self.assignment_lock = threading.Lock()
 
     @staticmethod
     def get_last_updated_time(repos_dir):
@@ -37,74 +63,166 @@ class GitRepoCloneAndPull:
         clone_url = repo.clone_url.replace(
             "https://", f"https://{self.github_org}:{self.github_access_token}@"
         )
-        Repo.clone_from(clone_url, repo_dir)
+        if self.mirror:
+            git.Git().clone(
+                "--bare",
+                "--filter=blob:none",
+                clone_url,
+                repo_dir,
+                kill_after_timeout=self.timeout,
+            )
+            # A bare clone has no fetch refspec of its own
+            for refspec in self.MIRROR_REFSPECS:
+                git.Git(repo_dir).config("--add", "remote.origin.fetch", refspec)
+        else:
+            git.Git().clone(clone_url, repo_dir, kill_after_timeout=self.timeout)
 
-    def unmatched_repos(self, repo_name_expression_list):
-        result = []
+    def fetch_mirror(self, repo_meta, repo_dir):
+        print(f"Fetching {repo_meta.name}")
+        git.Git(repo_dir).fetch("--prune", "origin", kill_after_timeout=self.timeout)
+
+    def get_repo_assignment(self, repo_name_expression_list, allow_stale=False):
+        # Matches every org repo against the expressions once per listing, so
+        # later lookups of matched and unmatched repos are dictionary lookups
+        expressions = tuple(repo_name_expression_list)
+        version = self.org_listing.get_snapshot(allow_stale)["updated"]
+        with self.assignment_lock:
+            cached = self.assignments.get(expressions)
+            if cached and cached[0] == version:
+                return cached[1]
         compiled_expressions = [
-            re.compile(repo_name_expression)
-            for repo_name_expression in repo_name_expression_list
+            (repo_name_expression, re.compile(repo_name_expression))
+            for repo_name_expression in expressions
         ]
-        for repo in self.repo_list:
+        assignment = {
+            "matched": {repo_name_expression: [] for repo_name_expression in expressions},
+            "unmatched": [],
+        }
+        for repo in self.org_listing.get_repos(allow_stale):
             matched = False
-            for repo_name_expression in compiled_expressions:
-                if repo_name_expression.match(repo.name):
+            for repo_name_expression, compiled_expression in compiled_expressions:
+                if compiled_expression.match(repo.name):
+                    assignment["matched"][repo_name_expression].append(repo)
                     matched = True
-                    break
             if not matched:
-                result.append({"name": repo.name, "clone_url": repo.clone_url})
-        return result
+                assignment["unmatched"].append(
+                    {"name": repo.name, "clone_url": repo.clone_url}
+                )
+        with self.assignment_lock:
+            self.assignments[expressions] = (version, assignment)
+        return assignment
+
+    def unmatched_repos(self, repo_name_expression_list):
+        # Answered from the stored listing, GitHub is only asked when there is none
+        return self.get_repo_assignment(
+            repo_name_expression_list, allow_stale=True
+        )["unmatched"]
 
-    def pull_to_dir(self, repo_basedir, project, repo_name_expression):
+    def pull_to_dir(self, repo_basedir, project, repo_name_expression, progress=None):
         print(f"Now pulling and cloning {project}")
         repos_dir = os.path.join(repo_basedir, project)
         if not repo_name_expression or len(repo_name_expression) < 3:
             raise ValueError(
                 "A filter expression is required before pulling the repos. The filter should be at least 3 characters long."
             )
+        requested = time.time()
+        os.makedirs(repo_basedir, exist_ok=True)
+        # Web workers and batch runs share the checkouts, one refresh of a
+        # project at a time
+        with FileLock(os.path.join(repo_basedir, f".{project}.lock")):
+            last_update = GitRepoCloneAndPull.get_last_updated_time(repos_dir)
+            if last_update and last_update >= requested:
+                print(f"{project} was refreshed by another process while waiting")
+                return {"update_date": last_update, "repos": []}
+            return self.pull_project_repos(repos_dir, repo_name_expression, progress)
+
+    def pull_project_repos(self, repos_dir, repo_name_expression, progress=None):
         if os.path.exists(repos_dir):
             print(f"Pulling repositories into {repos_dir}")
-        repo_regex = re.compile(repo_name_expression)
-        filtered_repo_list = [
-            repo for repo in self.repo_list if repo_regex.match(repo.name)
+        expressions = self.project_expressions
+        if repo_name_expression not in expressions:
+            expressions = expressions + [repo_name_expression]
+        filtered_repo_list = self.get_repo_assignment(expressions)["matched"][
+            repo_name_expression
         ]
         print(f"Found {len(filtered_repo_list)} repos to pull or clone")
-        for repo_meta in filtered_repo_list:
-            repo_dir = os.path.join(repos_dir, repo_meta.name)
+        progress_lock = threading.Lock()
+        finished = []
+
+        def refresh(repo_meta):
+            result = self.refresh_repo(repo_meta, repos_dir)
+            if progress:
+                with progress_lock:
+                    finished.append(result)
+                    progress(len(finished), len(filtered_repo_list))
+            return result
+
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                repo_results = list(executor.map(refresh, filtered_repo_list))
+        else:
+            repo_results = [refresh(repo_meta) for repo_meta in filtered_repo_list]
+        update_date = GitRepoCloneAndPull.set_last_updated_time(repos_dir)
+        return {"update_date": update_date, "repos": repo_results}
+
+    def refresh_repo(self, repo_meta, repos_dir):
+        repo_dir = os.path.join(repos_dir, repo_meta.name)
+        result = {"name": repo_meta.name, "result": "success"}
+        start = time.perf_counter()
+        try:
             if os.path.exists(repo_dir):
-                try:
-                    repo = Repo(repo_dir)
+                repo = Repo(repo_dir)
+                # Existing repos are refreshed the way they were cloned
+                if repo.bare:
+                    result["action"] = "fetch"
+                    self.fetch_mirror(repo_meta, repo_dir)
+                else:
+                    result["action"] = "pull"
                     self.pull_repo(repo, repo_meta, repo_dir)
-                except git.exc.InvalidGitRepositoryError as e:
-                    print(f"Invalid repository: {e}")
             else:
-                self.clone_repo(repo_meta, repo_dir)
-        update_date = GitRepoCloneAndPull.set_last_updated_time(repos_dir)
-        return update_date
+                result["action"] = "clone"
+                try:
+                    self.clone_repo(repo_meta, repo_dir)
+                except git.exc.GitCommandError:
+                    # Do not leave a half cloned repo behind to be pulled next time
+                    shutil.rmtree(repo_dir, ignore_errors=True)
+                    raise
+        except (git.exc.GitCommandError, git.exc.InvalidGitRepositoryError) as e:
+            print(f"Error refreshing {repo_meta.name}: {e}")
+            result["result"] = "failed"
+            result["error"] = str(e)
+        STAGE_TIMES.record(
+            result.get("action", "refresh"),
+            time.perf_counter() - start,
+            project=os.path.basename(repos_dir),
+            repo=repo_meta.name,
+        )
+        return result
 
     def pull_repo(self, repo, repo_meta, repo_dir, with_reset=False):
         if with_reset:
             print(f"Forcing repo reset on {repo_meta.name}")
             try:
-                repo.git.reset("--hard", "origin/main")
+                repo.git.reset(
+                    "--hard", "origin/main", kill_after_timeout=self.timeout
+                )
             except git.exc.GitCommandError as e:
                 print(f"Error resetting {repo_meta.name}: {e}")
         print(f"Pulling {repo_meta.name}")
         try:
-            repo.git.checkout("main")
-            repo.remotes.origin.pull()
+            repo.git.checkout("main", kill_after_timeout=self.timeout)
+            repo.remotes.origin.pull(kill_after_timeout=self.timeout)
         except git.exc.GitCommandError as e:
             try:
-                repo.git.checkout("master")
-                repo.remotes.origin.pull()
+                repo.git.checkout("master", kill_after_timeout=self.timeout)
+                repo.remotes.origin.pull(kill_after_timeout=self.timeout)
             except git.exc.GitCommandError as e:
                 if not with_reset:
                     print(f"Error pulling {repo_meta.name}: {e} - trying reset")
                     self.pull_repo(repo, repo_meta, repo_dir, with_reset=True)
                 else:
                     print(f"Error pulling {repo_meta.name}: {e} - skipping")
+                    raise e
 
     def list_all_repos(self):
-        g = Github(self.github_access_token)
-        org = g.get_organization(self.github_org)
-        return org.get_repos()
+        return self.org_listing.get_repos()
@@ -1,45 +1,63 @@
 import os
-import pickle
+import time
 
-from lib import GitRepoCloneAndPull
+from lib import STAGE_TIMES, GitRepoCloneAndPull, LruCache
 
 
 class GitCacheHandler:
-    def __init__(self, repo_dir):
-        self.repo_dir = repo_dir
+    # Other processes refresh projects as well, their updates are seen this soon
+    STAMP_CHECK_INTERVAL = 2
 
-    def cache_refresh_required(self, cache_file, project):
-        project_dir = os.path.join(self.repo_dir, project)
-        last_update_mtime = GitRepoCloneAndPull.get_last_updated_time(project_dir)
-        cache_file_mtime = (
-            os.stat(cache_file).st_mtime if os.path.exists(cache_file) else None
-        )
-        # IF the cache file does not exist or the last update time is newer than the cache file?
-        if not cache_file_mtime:
+    def __init__(self, repo_dir, metrics_store, memory_cache=None):
+        self.repo_dir = repo_dir
+        self.metrics_store = metrics_store
+        # Warm entries are served from memory, keyed by the last update of their
+        # project, which is read from disk again after a refresh or every few seconds
+        self.memory_cache = memory_cache or LruCache()
+        self.update_stamps = {}
+
+    def get_update_stamp(self, project):
+        checked, stamp = self.update_stamps.get(project, (None, None))
+        if checked is None or time.monotonic() - checked > self.STAMP_CHECK_INTERVAL:
+            project_dir = os.path.join(self.repo_dir, project)
+            stamp = GitRepoCloneAndPull.get_last_updated_time(project_dir)
+            self.update_stamps[project] = (time.monotonic(), stamp)
+        return stamp
+
+    def invalidate(self, project):
+        self.update_stamps.pop(project, None)
+        self.memory_cache.invalidate(lambda key: key[1] == project)
+
+    def cache_refresh_required(self, cache_updated, project):
+        last_update_mtime = self.get_update_stamp(project)
+        # IF the cache entry does not exist or the last update time is newer than the cache entry?
+        if not cache_updated:
             return True
-        if last_update_mtime and last_update_mtime > cache_file_mtime:
+        if last_update_mtime and last_update_mtime > cache_updated:
             return True
         return False
 
-    def get_cache_file_name(self, cache_name, project):
-        return os.path.join(self.repo_dir, project, "." + cache_name + ".cache")
-
-    def _load_cache(self, cache_file):
-        if os.path.exists(cache_file):
-            with open(cache_file, "rb") as f:
-                return pickle.load(f)
-        else:
-            return None
-
-    def save_cache(self, cache_entry, project, data):
-        cache_file = self.get_cache_file_name(cache_entry, project)
-        with open(cache_file, "wb") as f:
-            pickle.dump(data, f)
+    def save_cache(self, cache_entry, project, data, persist=True):
+        # Entries that are not persisted only live in the memory cache
+        if persist:
+            with STAGE_TIMES.stage("cache_save", entry=cache_entry, project=project):
+                self.metrics_store.save_cache_entry(project, cache_entry, data)
+        self.memory_cache.put(
+            (cache_entry, project, self.get_update_stamp(project)), data
+        )
 
-    def get_cache(self, cache_entry, project):
-        cache_file = self.get_cache_file_name(cache_entry, project)
-        if not self.cache_refresh_required(cache_file, project):
-            print(f"Loading cached commit times from {cache_file}")
-            return self._load_cache(cache_file)
+    def get_cache(self, cache_entry, project, persist=True):
+        key = (cache_entry, project, self.get_update_stamp(project))
+        data = self.memory_cache.get(key)
+        if data is not None or not persist:
+            return data
+        with STAGE_TIMES.stage("cache_load", entry=cache_entry, project=project):
+            cache_updated, data = self.metrics_store.get_cache_entry(
+                project, cache_entry
+            )
+        if not self.cache_refresh_required(cache_updated, project):
+            print(f"Loading cached {cache_entry} for {project}")
+            self.memory_cache.put(key, data)
+            return data
         else:
             return None
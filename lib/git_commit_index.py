@@ -0,0 +1,108 @@
+import datetime
+import os
+
+from git import GitCommandError
+
+
+class GitCommitIndex:
+    # Where the index was kept before it moved into the metrics store
+    PICKLE_INDEX_DIR = ".commit_index"
+
+    def __init__(self, log_reader, metrics_store):
+        self.log_reader = log_reader
+        self.metrics_store = metrics_store
+
+    def remove_pickle_index(self, repo_dir):
+        repo_dir = os.path.normpath(repo_dir)
+        index_dir = os.path.join(os.path.dirname(repo_dir), self.PICKLE_INDEX_DIR)
+        index_file = os.path.join(index_dir, os.path.basename(repo_dir) + ".index")
+        if not os.path.exists(index_file):
+            return
+        os.remove(index_file)
+        if not os.listdir(index_dir):
+            os.rmdir(index_dir)
+
+    def get_ref_tips(self, repo_dir) -> dict:
+        output = self.log_reader.run(
+            repo_dir, "for-each-ref", "--format=%(refname) %(objectname)"
+        )
+        return dict(line.split(" ") for line in output.splitlines())
+
+    def history_kept(self, repo_dir, old_tips, new_tips) -> bool:
+        # True when every commit reachable from the old tips is still reachable
+        # from the new ones, so the indexed commits are all still there
+        try:
+            output = self.log_reader.run(
+                repo_dir,
+                "rev-list",
+                "-n",
+                "1",
+                *set(old_tips.values()),
+                "--not",
+                *set(new_tips.values()),
+            )
+        except GitCommandError:
+            return False
+        return output.strip() == ""
+
+    @staticmethod
+    def log_since(window):
+        # git compares committer dates in its own timezone. A commit is not
+        # committed before it is authored, so a day of slack keeps all the window
+        # needs. until is left to in_window, rebased or cherry-picked commits are
+        # committed long after they were authored
+        since = window[0]
+        if not since:
+            return None
+        return str(datetime.date.fromisoformat(since) - datetime.timedelta(days=1))
+
+    @staticmethod
+    def in_window(commits, window) -> list:
+        # Only the commits authored in the window, by the author's local date
+        since, until = (datetime.date.fromisoformat(date) if date else None for date in window)
+        return [
+            commit
+            for commit in commits
+            if (not since or commit.author_date.date() >= since)
+            and (not until or commit.author_date.date() <= until)
+        ]
+
+    def sync_repo(self, project, repo, repo_dir, read_all=None, window=(None, None)):
+        # Brings the stored commits of a repo up to date with its refs. Without
+        # a read_all function only the commits added since the last sync are read.
+        # A window of since and until dates limits the history that is indexed
+        self.remove_pickle_index(repo_dir)
+        tips = self.get_ref_tips(repo_dir)
+        old_tips = self.metrics_store.get_repo_tips(project, repo)
+        same_window = self.metrics_store.get_repo_window(project, repo) == tuple(window)
+        if old_tips == tips and same_window:
+            return
+
+        since = self.log_since(window)
+        if (
+            not read_all
+            and old_tips
+            and tips
+            and same_window
+            and self.history_kept(repo_dir, old_tips, tips)
+        ):
+            new_commits = self.in_window(
+                self.log_reader.read_commits(
+                    repo_dir, [*set(tips.values()), "--not", *set(old_tips.values())], since
+                ),
+                window,
+            )
+            print(f"Adding {len(new_commits)} new commits to the index of {repo_dir}")
+            self.metrics_store.save_repo_commits(
+                project, repo, tips, new_commits, window=window
+            )
+        else:
+            print(f"Indexing all commits of {repo_dir}")
+            commits = (
+                read_all(repo_dir, since)
+                if read_all
+                else self.log_reader.read_commits(repo_dir, since=since)
+            )
+            self.metrics_store.save_repo_commits(
+                project, repo, tips, self.in_window(commits, window), replace=True, window=window
+            )
@@ -1,33 +1,67 @@
-import glob
+import datetime
 import os
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-from git import GitCommandError, InvalidGitRepositoryError, Repo
+from git import GitCommandError
 from pydriller import Repository
 
-from lib import GitCacheHandler
+from lib import (
+    STAGE_TIMES,
+    WEEKDAY_LABELS,
+    CommitRecord,
+    CommitTimeArrays,
+    GitCacheHandler,
+    GitCommitIndex,
+    GitLogReader,
+    GitMetricsStore,
+    GitRequiredFiles,
+    week_label,
+)
 
 
 class GitCommitTimes:
     CONFIG_LOCK_BACKUP_TIME = 5
+    COMMIT_BACKENDS = ["gitlog", "pydriller"]
 
-    def __init__(self, repos_dir, git_project_info):
+    def __init__(
+        self,
+        repos_dir,
+        git_project_info,
+        commit_backend="gitlog",
+        workers=1,
+        metrics_store=None,
+        memory_cache=None,
+    ):
+        if commit_backend not in self.COMMIT_BACKENDS:
+            raise ValueError(
+                f"Unknown commit backend {commit_backend}, expected one of {self.COMMIT_BACKENDS}"
+            )
         self.repo_dir = repos_dir
-        self.repo_name_expression = re.compile(r"[\\/]")
-        self.repo_map = self.get_repo_dirs(repos_dir)
-        self.cache_handler = GitCacheHandler(repos_dir)
-        self.time_results = None
+        # Repos are discovered per project on first use, not at startup
+        self.project_repos = {}
+        self.project_repos_lock = threading.Lock()
+        self.metrics_store = metrics_store or GitMetricsStore(
+            os.path.join(repos_dir, GitMetricsStore.DB_FILE)
+        )
+        self.cache_handler = GitCacheHandler(
+            repos_dir, self.metrics_store, memory_cache
+        )
         self.git_project_info = git_project_info
+        self.commit_backend = commit_backend
+        self.log_reader = GitLogReader()
+        self.commit_index = GitCommitIndex(self.log_reader, self.metrics_store)
+        # Per repo work is mostly waiting on git subprocesses, so threads are enough
+        # to keep all cores busy
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
 
-    def traverse_with_backoff_time(self, repo_url):
-        repo = Repository(repo_url, include_refs=True)
-        commit_list = []
+    def with_backoff_time(self, traverse):
         for n in range(3):
             try:
-                for commit in repo.traverse_commits():
-                    commit_list.append(commit)
-                break
+                return traverse()
             except GitCommandError as e:
                 if "bad revision 'HEAD'" in str(e):
                     break
@@ -35,162 +69,495 @@ class GitCommitTimes:
                     raise e
             except IOError as e:
                 time.sleep(self.CONFIG_LOCK_BACKUP_TIME)
-        return commit_list
+        return []
 
-    def get_repo_dirs(self, glob_dir) -> dict:
-        repo_list = glob.glob(glob_dir + "/*/*")
-        for repo_dir in repo_list:
-            try:
-                Repo(repo_dir).git_dir
-            except InvalidGitRepositoryError:
-                print(f"Invalid git repository: {repo_dir}")
-                repo_list.remove(repo_dir)
+    def traverse_with_backoff_time(self, repo_url, since=None):
+        # Full pydriller Commit objects, only needed by metrics that look at diffs
+        repo = Repository(
+            repo_url,
+            include_refs=True,
+            since=datetime.datetime.fromisoformat(since) if since else None,
+        )
+        return self.with_backoff_time(lambda: list(repo.traverse_commits()))
+
+    def read_repo_commits(self, repo_url, since=None) -> list:
+        # A full traversal through the configured backend, bypassing the commit index
+        if self.commit_backend == "gitlog":
+            return self.with_backoff_time(
+                lambda: list(self.log_reader.read_commits(repo_url, since=since))
+            )
+        return [
+            CommitRecord(
+                commit.hash,
+                commit.author_date,
+                int(commit.author_date.utcoffset().total_seconds()),
+                commit.author.email,
+            )
+            for commit in self.traverse_with_backoff_time(repo_url, since)
+        ]
+
+    def get_project_window(self, project):
+        # A project can limit its history to a period, e.g. the current semester.
+        # Only that period is read from git and indexed
+        project_info = self.git_project_info.get_project_info(project) or {}
+        return tuple(
+            str(project_info[key]) if project_info.get(key) else None
+            for key in ["since", "until"]
+        )
+
+    def get_date_range(self, project, since=None, until=None):
+        # The range asked for, narrowed down to the window of the project
+        window_since, window_until = self.get_project_window(project)
+        since = max(filter(None, [since, window_since]), default=None)
+        until = min(filter(None, [until, window_until]), default=None)
+        return since, until
+
+    @staticmethod
+    def entry_name(cache_entry, since=None, until=None):
+        if not since and not until:
+            return cache_entry
+        return f"{cache_entry}:{since or ''}:{until or ''}"
+
+    def range_entry(self, cache_entry, project, since=None, until=None):
+        # The cache entry of a metric over a range, and whether it is stored.
+        # Ranges narrower than the project window come from requests and are
+        # only kept in memory, so clients can not grow the store
+        persist = (since, until) == self.get_project_window(project)
+        return self.entry_name(cache_entry, since, until), persist
+
+    def sync_entry(self, project):
+        # A project synced with another window has to be synced again
+        return self.entry_name("sync_project", *self.get_project_window(project))
+
+    def sync_repo(self, project, name, repo_url):
+        # pydriller can not read only the commits added since the last sync, so
+        # it always reads everything
+        read_all = self.read_repo_commits if self.commit_backend == "pydriller" else None
+        window = self.get_project_window(project)
+        with STAGE_TIMES.stage("commit_traversal", project=project, repo=name):
+            self.with_backoff_time(
+                lambda: self.commit_index.sync_repo(
+                    project, name, repo_url, read_all, window
+                )
+            )
+
+    def sync_project(self, project, ignore_cache=False):
+        # One scan per repo into the metrics store, shared by all metrics below.
+        # Only repos whose refs moved since the last sync are read again
+        if self.cache_handler.get_cache(self.sync_entry(project), project) and not ignore_cache:
+            return
+        repos = self.get_filtered_repos(project)
+        self.map_repos(
+            lambda name, repo_url: self.sync_repo(project, name, repo_url), repos
+        )
+        self.metrics_store.remove_other_repos(project, [name for name, _ in repos])
+        self.cache_handler.save_cache(self.sync_entry(project), project, True)
+
+    def get_commit_arrays(
+        self, project, ignore_cache=False, since=None, until=None
+    ) -> CommitTimeArrays:
+        # Only kept in memory, it is the histograms computed from it that get
+        # cached. Narrower ranges come from requests, they are loaded from the
+        # store every time instead of filling the memory cache with arrays
+        memoise = (since, until) == self.get_project_window(project)
+        key = (
+            "commit_arrays",
+            project,
+            self.cache_handler.get_update_stamp(project),
+            since,
+            until,
+        )
+        arrays = self.cache_handler.memory_cache.get(key) if memoise else None
+        if arrays is None or ignore_cache:
+            self.sync_project(project, ignore_cache)
+            arrays = CommitTimeArrays.from_local_times(
+                [name for name, _ in self.get_filtered_repos(project)],
+                self.metrics_store.get_local_times(project, None, since, until),
+            )
+            if memoise:
+                self.cache_handler.memory_cache.put(key, arrays)
+        return arrays
+
+    def warm_cache(self, project):
+        # Computes every metric of a project, so the next page view is served from cache
+        self.get_commits_over_weeks(project)
+        self.get_all_commit_times(project)
+        self.get_commits_per_weekday(project)
+        self.get_number_commits(project)
+        self.get_commits_per_day(project)
+        self.get_commits_per_author(project)
+        self.get_tagged_state(project)
+        project_info = self.git_project_info.get_project_info(project)
+        if project_info.get("required_files"):
+            self.get_got_required_files(project)
+
+    def imap_repos(self, function, repos):
+        # Results keep the order of repos, whichever worker finishes first, and
+        # are yielded as soon as they and the ones before them are done
+        if not self.executor:
+            return (function(name, repo_url) for name, repo_url in repos)
+        return self.executor.map(lambda repo: function(*repo), repos)
+
+    def map_repos(self, function, repos) -> list:
+        return list(self.imap_repos(function, repos))
+
+    def iter_repo_results(self, project, cache_entry, repo_result, needs_sync=True, persist=True):
+        # Streaming variant of the metrics: syncs and computes one repo at a time
+        # and yields its result right away. repo_result(name, repo_url) computes
+        # the result of a single synced repo
+        cache = self.cache_handler.get_cache(cache_entry, project, persist)
+        if cache:
+            yield from cache
+            return
+        synced = not needs_sync or self.cache_handler.get_cache(self.sync_entry(project), project)
+        repos = self.get_filtered_repos(project)
+
+        def compute(name, repo_url):
+            if not synced:
+                self.sync_repo(project, name, repo_url)
+            return repo_result(name, repo_url)
+
+        results = []
+        for result in self.imap_repos(compute, repos):
+            results.append(result)
+            yield result
+        if not synced:
+            self.metrics_store.remove_other_repos(project, [name for name, _ in repos])
+            self.cache_handler.save_cache(self.sync_entry(project), project, True)
+        self.cache_handler.save_cache(cache_entry, project, results, persist)
+
+    def iter_commits_over_weeks(self, project, since=None, until=None):
+        since, until = self.get_date_range(project, since, until)
+        cache_entry, persist = self.range_entry("get_commits_over_iso_weeks", project, since, until)
+        return self.iter_repo_results(
+            project,
+            cache_entry,
+            lambda name, repo_url: self.collect_week_brackets(
+                project, [name], name, since, until
+            )[0],
+            persist=persist,
+        )
+
+    def iter_commit_times(self, project, since=None, until=None):
+        since, until = self.get_date_range(project, since, until)
+        cache_entry, persist = self.range_entry("get_all_commit_times", project, since, until)
+        return self.iter_repo_results(
+            project,
+            cache_entry,
+            lambda name, repo_url: self.collect_time_brackets(
+                project, [name], name, since, until
+            )[0],
+            persist=persist,
+        )
+
+    def iter_got_required_files(self, project):
+        required_files = self.get_required_files_check(project)
+        return self.iter_repo_results(
+            project,
+            "get_got_required_files",
+            lambda name, repo_url: {"name": name, **required_files.check(repo_url)},
+            needs_sync=False,
+        )
+
+    @staticmethod
+    def is_git_repo(repo_dir):
+        # A HEAD file is all a checkout or a bare repo needs, no need to open it
+        return os.path.isfile(os.path.join(repo_dir, ".git", "HEAD")) or os.path.isfile(
+            os.path.join(repo_dir, "HEAD")
+        )
+
+    def get_repo_dirs(self, project) -> dict:
+        # Rescanned only when repos were added to or removed from the project dir
+        project_dir = os.path.join(self.repo_dir, project)
+        try:
+            project_mtime = os.stat(project_dir).st_mtime
+        except FileNotFoundError:
+            return {}
+        with self.project_repos_lock:
+            cached = self.project_repos.get(project)
+            if cached and cached[0] == project_mtime:
+                return cached[1]
         repo_map = {}
-        for repo in repo_list:
-            name = self.get_repo_name(repo)
-            repo_map[name] = repo
+        with os.scandir(project_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_dir():
+                    continue
+                if self.is_git_repo(entry.path):
+                    repo_map[entry.name] = entry.path
+                else:
+                    print(f"Invalid git repository: {entry.path}")
+        with self.project_repos_lock:
+            self.project_repos[project] = (project_mtime, repo_map)
         return repo_map
 
-    def get_repo_name(self, repo_url):
-        return self.repo_name_expression.split(repo_url)[-1]
+    def invalidate(self, project):
+        # Called after a refresh, a clone that finished after the project dir was
+        # scanned does not change its mtime
+        with self.project_repos_lock:
+            self.project_repos.pop(project, None)
+        self.cache_handler.invalidate(project)
 
     def get_filtered_repos(self, project):
-        project_info = self.git_project_info.get_project_info(project)
-        expression = re.compile(project_info["expression"])
-        return [repo for repo in self.repo_map.items() if expression.match(repo[0])]
+        expression = self.git_project_info.get_project_expression(project)
+        return sorted(
+            repo
+            for repo in self.get_repo_dirs(project).items()
+            if expression.match(repo[0])
+        )
 
-    def get_commits_over_weeks(self, project, ignore_cache=False) -> list:
-        cache = self.cache_handler.get_cache("get_commits_over_weeks", project)
+    def get_commits_over_weeks(
+        self, project, ignore_cache=False, since=None, until=None
+    ) -> tuple:
+        since, until = self.get_date_range(project, since, until)
+        cache_entry, persist = self.range_entry("get_commits_over_iso_weeks", project, since, until)
+        cache = self.cache_handler.get_cache(cache_entry, project, persist)
         if cache and not ignore_cache:
-            return cache
+            return self.get_week_labels(cache), cache
         else:
-            week_results = []
-            for name, repo_url in self.get_filtered_repos(project):
-                week_results.append(
-                    {
-                        "name": name,
-                        "week_brackets": self.get_week_number_commits(repo_url),
-                    }
-                )
+            self.sync_project(project, ignore_cache)
+            week_results = self.collect_week_brackets(
+                project,
+                [name for name, _ in self.get_filtered_repos(project)],
+                None,
+                since,
+                until,
+            )
             if week_results:
-                self.cache_handler.save_cache(
-                    "get_commits_over_weeks", project, week_results
-                )
-            return week_results
-
-    def get_week_number_commits(self, repo_url):
-        week_brackets = {}
-        commits = self.traverse_with_backoff_time(repo_url)
-        for commit in commits:
-            commit_date = commit.author_date
-            week_number = str(commit_date.isocalendar()[1])
-            if week_number not in week_brackets:
-                week_brackets[week_number] = 0
-            week_brackets[week_number] += 1
-        return week_brackets
-
-    def get_all_commit_times(self, project) -> list:
-        cache = self.cache_handler.get_cache("get_all_commit_times", project)
-        time_labels = [f"{hour:02d}:00" for hour in range(0, 24)]
+                self.cache_handler.save_cache(cache_entry, project, week_results, persist)
+            return self.get_week_labels(week_results), week_results
+
+    @staticmethod
+    def get_week_labels(week_results) -> list:
+        return sorted({label for repo in week_results for label in repo["week_brackets"]})
+
+    def collect_week_brackets(self, project, names, repo=None, since=None, until=None) -> list:
+        week_brackets = {name: {} for name in names}
+        for name, year, week, count in self.metrics_store.week_histogram(
+            project, repo, since, until
+        ):
+            if name in week_brackets:
+                week_brackets[name][week_label(year, week)] = count
+        return [
+            {"name": name, "week_brackets": brackets}
+            for name, brackets in week_brackets.items()
+        ]
+
+    TIME_LABELS = [f"{hour:02d}:00" for hour in range(0, 24)]
+
+    def get_all_commit_times(self, project, since=None, until=None) -> tuple:
+        since, until = self.get_date_range(project, since, until)
+        cache_entry, persist = self.range_entry("get_all_commit_times", project, since, until)
+        cache = self.cache_handler.get_cache(cache_entry, project, persist)
+        time_labels = self.TIME_LABELS
         if cache:
             return time_labels, cache
         else:
-            time_results = []
-            for name, repo_url in self.get_filtered_repos(project):
-                time_results.append(
-                    {
-                        "name": name,
-                        "time_brackets": self.get_repo_commit_times(
-                            repo_url, time_labels
-                        ),
-                    }
-                )
+            time_results = self.hour_results(
+                self.get_commit_arrays(project, since=since, until=until)
+            )
             if time_results:
-                self.cache_handler.save_cache(
-                    "get_all_commit_times", project, time_results
-                )
+                self.cache_handler.save_cache(cache_entry, project, time_results, persist)
             return time_labels, time_results
 
-    def get_repo_commit_times(self, repo_url, time_labels):
-        time_brackets = {label: 0 for label in time_labels}
-        commits = self.traverse_with_backoff_time(repo_url)
-        for commit in commits:
-            date = commit.author_date
-            clean_hour = f"{date.hour:02d}:00"
-            time_brackets[clean_hour] += 1
-        return time_brackets
-
-    def get_number_commits(self, project) -> list:
-        cache = self.cache_handler.get_cache("get_number_commits", project)
+    def hour_results(self, arrays) -> list:
+        return [
+            {
+                "name": name,
+                "time_brackets": {
+                    label: int(count) for label, count in zip(self.TIME_LABELS, row)
+                },
+            }
+            for name, row in zip(arrays.names, arrays.hour_histogram())
+        ]
+
+    def get_commits_per_weekday(self, project, since=None, until=None) -> tuple:
+        since, until = self.get_date_range(project, since, until)
+        cache_entry, persist = self.range_entry("get_commits_per_weekday", project, since, until)
+        cache = self.cache_handler.get_cache(cache_entry, project, persist)
+        if cache:
+            return WEEKDAY_LABELS, cache
+        else:
+            arrays = self.get_commit_arrays(project, since=since, until=until)
+            weekday_results = [
+                {
+                    "name": name,
+                    "weekday_brackets": {
+                        label: int(count) for label, count in zip(WEEKDAY_LABELS, row)
+                    },
+                }
+                for name, row in zip(arrays.names, arrays.weekday_histogram())
+            ]
+            self.cache_handler.save_cache(cache_entry, project, weekday_results, persist)
+            return WEEKDAY_LABELS, weekday_results
+
+    def collect_time_brackets(self, project, names, repo=None, since=None, until=None) -> list:
+        return self.hour_results(
+            CommitTimeArrays.from_local_times(
+                names, self.metrics_store.get_local_times(project, repo, since, until)
+            )
+        )
+
+    def get_number_commits(self, project, since=None, until=None) -> list:
+        since, until = self.get_date_range(project, since, until)
+        cache_entry, persist = self.range_entry("get_number_commits", project, since, until)
+        cache = self.cache_handler.get_cache(cache_entry, project, persist)
         if cache:
             return cache
         else:
-            number_results = []
-            for name, repo_url in self.get_filtered_repos(project):
-                commits = self.traverse_with_backoff_time(repo_url)
-                number_results.append(
-                    {
-                        "name": name,
-                        "number_commits": len(list(commits)),
-                    }
-                )
-            self.cache_handler.save_cache("get_number_commits", project, number_results)
+            arrays = self.get_commit_arrays(project, since=since, until=until)
+            number_results = [
+                {"name": name, "number_commits": int(count)}
+                for name, count in zip(arrays.names, arrays.counts())
+            ]
+            self.cache_handler.save_cache(cache_entry, project, number_results, persist)
             return number_results
 
+    def get_commits_per_day(self, project, since=None, until=None) -> list:
+        since, until = self.get_date_range(project, since, until)
+        cache_entry, persist = self.range_entry("get_commits_per_day", project, since, until)
+        cache = self.cache_handler.get_cache(cache_entry, project, persist)
+        if cache:
+            return cache
+        else:
+            self.sync_project(project)
+            day_brackets = {name: {} for name, _ in self.get_filtered_repos(project)}
+            for repo, day, count in self.metrics_store.day_histogram(
+                project, None, since, until
+            ):
+                if repo in day_brackets:
+                    day_brackets[repo][day] = count
+            day_results = [
+                {"name": name, "day_brackets": brackets}
+                for name, brackets in day_brackets.items()
+            ]
+            self.cache_handler.save_cache(cache_entry, project, day_results, persist)
+            return day_results
+
+    def get_commits_per_author(self, project, since=None, until=None) -> list:
+        since, until = self.get_date_range(project, since, until)
+        cache_entry, persist = self.range_entry("get_commits_per_author", project, since, until)
+        cache = self.cache_handler.get_cache(cache_entry, project, persist)
+        if cache:
+            return cache
+        else:
+            self.sync_project(project)
+            authors = {name: {} for name, _ in self.get_filtered_repos(project)}
+            for repo, author, count in self.metrics_store.author_counts(
+                project, None, since, until
+            ):
+                if repo in authors:
+                    authors[repo][author] = count
+            author_results = [
+                {"name": name, "authors": repo_authors}
+                for name, repo_authors in authors.items()
+            ]
+            self.cache_handler.save_cache(cache_entry, project, author_results, persist)
+            return author_results
+
+    # The cross project views below only read the rollups of the metrics store,
+    # they cover every project as of its last sync
+    def get_activity_per_week(self, since=None, until=None) -> tuple:
+        weeks = {}
+        for project, year, week, count in self.metrics_store.project_weeks(since, until):
+            weeks.setdefault(project, {})[week_label(year, week)] = count
+        labels = sorted({label for counts in weeks.values() for label in counts})
+        return labels, [
+            {"name": project, "week_brackets": [counts.get(label, 0) for label in labels]}
+            for project, counts in weeks.items()
+        ]
+
+    def get_activity_per_day(self, since=None, until=None):
+        days = {}
+        for project, day, count in self.metrics_store.project_days(since, until):
+            days.setdefault(project, {})[day] = count
+        return [{"name": project, "day_brackets": counts} for project, counts in days.items()]
+
+    def get_authors(self, since=None, until=None) -> list:
+        authors = [
+            {"author": author, "commits": commits, "repos": repos, "first_day": first, "last_day": last}
+            for author, commits, repos, first, last in self.metrics_store.author_totals(since, until)
+        ]
+        authors.sort(key=lambda author: author["commits"], reverse=True)
+        return authors
+
+    def get_author_activity(self, author, since=None, until=None) -> dict:
+        days = {}
+        repos = {}
+        for project, repo, day, count in self.metrics_store.author_days(author, since, until):
+            days[day] = days.get(day, 0) + count
+            repos[(project, repo)] = repos.get((project, repo), 0) + count
+        return {
+            "author": author,
+            "day_brackets": days,
+            "repos": [
+                {"project": project, "name": repo, "commits": count}
+                for (project, repo), count in repos.items()
+            ],
+        }
+
+    # Tag name, the commit date of what an annotated tag points to, the commit
+    # date of a lightweight tag and the date of the tag itself as fallback
+    TAG_FORMAT = "%(refname:short)%00%(*committerdate:iso-strict)%00%(committerdate:iso-strict)%00%(creatordate:iso-strict)"
+
     def get_tagged_state(self, project) -> list:
         cache = self.cache_handler.get_cache("get_tagged_state", project)
         if cache:
             return cache
         else:
-            tag_results = []
-            for name, repo_url in self.get_filtered_repos(project):
-                repo = Repo(repo_url)
-                tags = sorted(repo.tags, key=lambda t: t.commit.committed_datetime)
-                if tags:
-                    tag_results.append(
-                        {
-                            "name": name,
-                            "tag": tags[-1].name,
-                            "date": tags[-1].commit.committed_datetime,
-                        }
-                    )
-                else:
-                    tag_results.append(
-                        {"name": name, "tag": "No tags", "date": "No tags"}
-                    )
+            project_info = self.git_project_info.get_project_info(project)
+            tag_pattern = project_info.get("tag_pattern")
+            tag_pattern = re.compile(tag_pattern) if tag_pattern else None
+            tag_results = self.map_repos(
+                lambda name, repo_url: self.get_repo_tagged_state(
+                    name, repo_url, tag_pattern
+                ),
+                self.get_filtered_repos(project),
+            )
             self.cache_handler.save_cache("get_tagged_state", project, tag_results)
             return tag_results
 
+    def get_repo_tagged_state(self, name, repo_url, tag_pattern=None):
+        # A single for-each-ref per repo, newest tag first, instead of
+        # resolving the commit of every tag on its own
+        output = self.log_reader.run(
+            repo_url,
+            "for-each-ref",
+            "--sort=-creatordate",
+            f"--format={self.TAG_FORMAT}",
+            "refs/tags",
+        )
+        for line in output.splitlines():
+            tag, *dates = line.split("\0")
+            if tag_pattern and not tag_pattern.match(tag):
+                continue
+            date = next(date for date in dates if date)
+            return {
+                "name": name,
+                "tag": tag,
+                "date": datetime.datetime.fromisoformat(date),
+            }
+        return {"name": name, "tag": "No tags", "date": "No tags"}
+
+    def get_required_files_check(self, project_name) -> GitRequiredFiles:
+        project = self.git_project_info.get_project_info(project_name)
+        return GitRequiredFiles(
+            self.log_reader,
+            project["required_files"],
+            project.get("required_files_ref", "HEAD"),
+            project.get("required_files_depth", 1),
+        )
+
     def get_got_required_files(self, project_name) -> list:
         cache = self.cache_handler.get_cache("get_got_required_files", project_name)
         if cache:
             return cache
         else:
-            project = self.git_project_info.get_project_info(project_name)
-            project_dir = os.path.join(self.repo_dir, project["name"])
-            required_files_results = []
-
-            regexes = {regex[0]: re.compile(regex[1]) for regex in project["required_files"].items()}
-            for name, repourl in self.get_filtered_repos(project_name):
-                project_repo_dir = os.path.join(project_dir, name)
-                current = {"name": name}
-                project_files = os.listdir(project_repo_dir)
-                for regex in regexes:
-                    current[regex] = False
-                    for project_file in project_files:
-                        if regexes[regex].match(project_file):
-                            current[regex] = True
-                            break
-
-                # Add completed results
-                required_count = 0
-                for regex in regexes:
-                    if current[regex]:
-                        required_count += 1
-                current["required_files"] = required_count
-
-                required_files_results.append(current)
+            required_files = self.get_required_files_check(project_name)
+            required_files_results = self.map_repos(
+                lambda name, repo_url: {"name": name, **required_files.check(repo_url)},
+                self.get_filtered_repos(project_name),
+            )
             self.cache_handler.save_cache(
-                "get_tagged_state", project_name, required_files_results
+                "get_got_required_files", project_name, required_files_results
             )
             return required_files_results
@@ -0,0 +1,65 @@
+import datetime
+import subprocess
+from collections import namedtuple
+
+from git import GitCommandError
+
+# The minimal per-commit record every metric is computed from. tz_offset is
+# the author's UTC offset in seconds, east of UTC being positive.
+CommitRecord = namedtuple("CommitRecord", ["sha", "author_date", "tz_offset", "author"])
+
+
+class GitLogReader:
+    FIELD_SEPARATOR = "\x1f"
+    LOG_FORMAT = "%H%x1f%aI%x1f%ae"
+
+    def __init__(self, git_binary="git"):
+        self.git_binary = git_binary
+
+    def run(self, repo_dir, *args) -> str:
+        command = [self.git_binary, "-C", repo_dir, *args]
+        process = subprocess.run(command, capture_output=True)
+        if process.returncode != 0:
+            raise GitCommandError(
+                command,
+                process.returncode,
+                process.stderr.decode("utf-8", errors="replace"),
+            )
+        return process.stdout.decode("utf-8", errors="replace")
+
+    def read_commits(self, repo_dir, revisions=("--all",), since=None):
+        # Streams a single git log over the given revisions, reading only the
+        # header fields instead of building full commit objects. since lets git
+        # stop walking history at a committer date
+        command = [
+            self.git_binary,
+            "-C",
+            repo_dir,
+            "log",
+            f"--format={self.LOG_FORMAT}",
+            *([f"--since={since}"] if since else []),
+            *revisions,
+        ]
+        process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        try:
+            for line in process.stdout:
+                yield self.parse_line(line.decode("utf-8", errors="replace"))
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read().decode("utf-8", errors="replace")
+            process.stderr.close()
+            status = process.wait()
+        if status != 0:
+            raise GitCommandError(command, status, stderr)
+
+    def parse_line(self, line):
+        sha, author_date, author = line.rstrip("\n").split(self.FIELD_SEPARATOR)
+        author_date = datetime.datetime.fromisoformat(author_date)
+        return CommitRecord(
+            sha,
+            author_date,
+            int(author_date.utcoffset().total_seconds()),
+            author,
+        )
@@ -0,0 +1,64 @@
+import os
+
+from lib import (
+    GitCommitTimes,
+    GitHubOrgListing,
+    GitProjectInfo,
+    GitRepoCloneAndPull,
+    LruCache,
+)
+
+
+class GitMetaServices:
+    # Everything gitmeta.yml configures, shared by the web app and the batch run
+    def __init__(self, settings):
+        self.settings = settings
+        # The store, the org snapshot and the locks all live in the repo dir
+        os.makedirs(settings["git_repo_dir"], exist_ok=True)
+        self.gpi = GitProjectInfo(
+            settings["projects"], settings["git_repo_dir"], settings["github_organization"]
+        )
+        self.gct = GitCommitTimes(
+            settings["git_repo_dir"],
+            self.gpi,
+            settings.get("commit_backend", "gitlog"),
+            settings.get("workers", 1),
+            memory_cache=LruCache(
+                settings.get("memory_cache_size", 256),
+                settings.get("memory_cache_ttl", 600),
+            ),
+        )
+        self.org_listing = GitHubOrgListing(
+            settings["github_access_token"],
+            settings["github_organization"],
+            os.path.join(settings["git_repo_dir"], ".org_repos.json"),
+            settings.get("org_listing_ttl", 3600),
+            settings.get("github_api_url", GitHubOrgListing.API_URL),
+        )
+        self.grcap = GitRepoCloneAndPull(
+            settings["github_access_token"],
+            settings["github_organization"],
+            settings.get("pull_workers", 1),
+            settings.get("pull_timeout"),
+            self.org_listing,
+            self.gpi.project_expressions,
+            settings.get("mirror", False),
+        )
+
+    def refresh_project(self, project, progress=None, pull=True):
+        project_info = self.gpi.get_project_info(project)
+        result = {"repos": []}
+        if pull:
+            pull_result = self.grcap.pull_to_dir(
+                self.settings["git_repo_dir"],
+                project_info["name"],
+                project_info["expression"],
+                progress,
+            )
+            result = {
+                "update_date": self.gpi.convert_timestamp(pull_result["update_date"]),
+                "repos": pull_result["repos"],
+            }
+        self.gct.invalidate(project_info["name"])
+        self.gct.warm_cache(project_info["name"])
+        return result
@@ -0,0 +1,388 @@
+import datetime
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# Local time of a commit as seen by its author, used by the aggregate queries
+LOCAL_TS = "(author_ts + tz_offset)"
+WEEKDAY = f"(({LOCAL_TS} / 86400 + 3) % 7)"
+LOCAL_DAY = f"date({LOCAL_TS}, 'unixepoch')"
+
+
+def iso_thursday(ts):
+    # ISO weeks are numbered by the year their Thursday falls in
+    return f"({ts} - (({ts} / 86400 + 3) % 7) * 86400 + 3 * 86400)"
+
+
+def iso_year(ts):
+    return f"CAST(strftime('%Y', {iso_thursday(ts)}, 'unixepoch') AS INTEGER)"
+
+
+def iso_week(ts):
+    return f"(CAST(strftime('%j', {iso_thursday(ts)}, 'unixepoch') AS INTEGER) - 1) / 7 + 1"
+
+
+ISO_YEAR = iso_year(LOCAL_TS)
+ISO_WEEK = iso_week(LOCAL_TS)
+# Start of the day of a day rollup row, on the same scale as LOCAL_TS
+DAY_TS = "CAST(strftime('%s', day) AS INTEGER)"
+# Local times are at most this far from UTC
+MAX_TZ_OFFSET = 14 * 3600
+
+
+def local_day_ts(day):
+    # Start of an ISO date on the same scale as LOCAL_TS
+    return (datetime.date.fromisoformat(day) - datetime.date(1970, 1, 1)).days * 86400
+
+
+def iso_week_key(day):
+    iso_year, week, _ = datetime.date.fromisoformat(day).isocalendar()
+    return iso_year * 100 + week
+
+
+class GitMetricsStore:
+    DB_FILE = ".gitmeta.sqlite"
+    # Commit counts kept next to the commits, per repo so a repo that is indexed
+    # again only replaces its own rows. Columns after project and repo, in order
+    ROLLUPS = {
+        "repo_day": {"day": LOCAL_DAY},
+        "author_day": {"author": "author", "day": LOCAL_DAY},
+        "repo_week": {"year": ISO_YEAR, "week": ISO_WEEK},
+    }
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS commits (
+            project TEXT NOT NULL,
+            repo TEXT NOT NULL,
+            sha TEXT NOT NULL,
+            author_ts INTEGER NOT NULL,
+            tz_offset INTEGER NOT NULL,
+            author TEXT NOT NULL,
+            PRIMARY KEY (project, repo, sha)
+        );
+        CREATE INDEX IF NOT EXISTS commits_repo_date ON commits (project, repo, author_ts);
+        CREATE INDEX IF NOT EXISTS commits_date ON commits (author_ts);
+        CREATE TABLE IF NOT EXISTS repo_refs (
+            project TEXT NOT NULL,
+            repo TEXT NOT NULL,
+            tips TEXT NOT NULL,
+            PRIMARY KEY (project, repo)
+        );
+        CREATE TABLE IF NOT EXISTS repo_windows (
+            project TEXT NOT NULL,
+            repo TEXT NOT NULL,
+            since TEXT,
+            until TEXT,
+            PRIMARY KEY (project, repo)
+        );
+        CREATE TABLE IF NOT EXISTS repo_day (
+            project TEXT NOT NULL,
+            repo TEXT NOT NULL,
+            day TEXT NOT NULL,
+            commits INTEGER NOT NULL,
+            PRIMARY KEY (project, repo, day)
+        );
+        CREATE TABLE IF NOT EXISTS author_day (
+            project TEXT NOT NULL,
+            repo TEXT NOT NULL,
+            author TEXT NOT NULL,
+            day TEXT NOT NULL,
+            commits INTEGER NOT NULL,
+            PRIMARY KEY (project, repo, author, day)
+        );
+        CREATE INDEX IF NOT EXISTS author_day_author ON author_day (author, day);
+        CREATE TABLE IF NOT EXISTS repo_week (
+            project TEXT NOT NULL,
+            repo TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            week INTEGER NOT NULL,
+            commits INTEGER NOT NULL,
+            PRIMARY KEY (project, repo, year, week)
+        );
+        CREATE TABLE IF NOT EXISTS refresh_jobs (
+            id TEXT PRIMARY KEY,
+            updated REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS cache (
+            project TEXT NOT NULL,
+            name TEXT NOT NULL,
+            updated REAL NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (project, name)
+        );
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        # sqlite3 connections can not be shared between threads, so every
+        # Flask or pool thread gets its own
+        if not hasattr(self.local, "connection"):
+            # On a fresh install the repo dir only exists after the first refresh
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_file)), exist_ok=True)
+            connection = sqlite3.connect(self.db_file, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.SCHEMA)
+            self.local.connection = connection
+            self.backfill_rollups(connection)
+        return self.local.connection
+
+    def backfill_rollups(self, connection):
+        # Stores written before the rollups existed only have the commits
+        if connection.execute("SELECT 1 FROM repo_day LIMIT 1").fetchone():
+            return
+        with connection:
+            for project, repo in connection.execute(
+                "SELECT DISTINCT project, repo FROM commits"
+            ).fetchall():
+                self.rebuild_rollups(connection, project, repo)
+
+    def rollup_insert(self, connection, table, project, repo, after_rowid=None):
+        # Counts the commits of a repo into a rollup, or only those inserted
+        # after a rowid, so the ISO weeks and days all come from the same SQL
+        columns = self.ROLLUPS[table]
+        keys = ", ".join(columns.values())
+        where, parameters = "project = ? AND repo = ?", [project, repo]
+        if after_rowid is not None:
+            where += " AND rowid > ?"
+            parameters.append(after_rowid)
+        connection.execute(
+            f"INSERT INTO {table} SELECT project, repo, {keys}, COUNT(*) FROM commits "
+            f"WHERE {where} GROUP BY {keys} "
+            "ON CONFLICT DO UPDATE SET commits = commits + excluded.commits",
+            parameters,
+        )
+
+    def rebuild_rollups(self, connection, project, repo):
+        for table in self.ROLLUPS:
+            connection.execute(
+                f"DELETE FROM {table} WHERE project = ? AND repo = ?", (project, repo)
+            )
+            self.rollup_insert(connection, table, project, repo)
+
+    def add_to_rollups(self, connection, project, repo, after_rowid):
+        for table in self.ROLLUPS:
+            self.rollup_insert(connection, table, project, repo, after_rowid)
+
+    def get_repo_tips(self, project, repo):
+        row = self.connection.execute(
+            "SELECT tips FROM repo_refs WHERE project = ? AND repo = ?", (project, repo)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_repo_window(self, project, repo):
+        # The dates the indexed history of a repo was limited to, if any
+        row = self.connection.execute(
+            "SELECT since, until FROM repo_windows WHERE project = ? AND repo = ?",
+            (project, repo),
+        ).fetchone()
+        return tuple(row) if row else (None, None)
+
+    def save_repo_commits(self, project, repo, tips, commits, replace=False, window=(None, None)):
+        with self.connection as connection:
+            if replace:
+                connection.execute(
+                    "DELETE FROM commits WHERE project = ? AND repo = ?", (project, repo)
+                )
+            changes = connection.total_changes
+            (last_rowid,) = connection.execute("SELECT MAX(rowid) FROM commits").fetchone()
+            connection.executemany(
+                "INSERT OR IGNORE INTO commits VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        project,
+                        repo,
+                        commit.sha,
+                        int(commit.author_date.timestamp()),
+                        commit.tz_offset,
+                        commit.author,
+                    )
+                    for commit in commits
+                ],
+            )
+            # New commits are added to the rollups, unless some of them were in
+            # the index already and the repo has to be counted again
+            if not replace and connection.total_changes - changes == len(commits):
+                self.add_to_rollups(connection, project, repo, last_rowid or 0)
+            else:
+                self.rebuild_rollups(connection, project, repo)
+            connection.execute(
+                "INSERT OR REPLACE INTO repo_refs VALUES (?, ?, ?)",
+                (project, repo, json.dumps(tips)),
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO repo_windows VALUES (?, ?, ?, ?)",
+                (project, repo, *window),
+            )
+
+    def remove_other_repos(self, project, repos):
+        # Drops repos that are no longer part of the project on disk
+        with self.connection as connection:
+            for table in ["commits", "repo_refs", "repo_windows", *self.ROLLUPS]:
+                known = connection.execute(
+                    f"SELECT DISTINCT repo FROM {table} WHERE project = ?", (project,)
+                ).fetchall()
+                connection.executemany(
+                    f"DELETE FROM {table} WHERE project = ? AND repo = ?",
+                    [(project, repo) for (repo,) in known if repo not in repos],
+                )
+
+    def get_local_times(self, project, repo=None, since=None, until=None) -> list:
+        # Rows of (repo, the local times of its commits as comma separated text),
+        # which loads far faster than a row per commit
+        where, parameters = self.commit_filter(project, repo, since, until)
+        return self.connection.execute(
+            f"SELECT repo, group_concat({LOCAL_TS}) FROM commits WHERE {where} GROUP BY repo",
+            parameters,
+        ).fetchall()
+
+    @staticmethod
+    def repo_filter(project, repo=None):
+        # All aggregates can be asked for a whole project or a single repo
+        if repo is None:
+            return "project = ?", (project,)
+        return "project = ? AND repo = ?", (project, repo)
+
+    @classmethod
+    def commit_filter(cls, project, repo=None, since=None, until=None):
+        # since and until are ISO dates, both included, in the author's local time.
+        # The looser bounds on author_ts are there so SQLite can use its index
+        where, parameters = cls.repo_filter(project, repo)
+        where, parameters = [where], list(parameters)
+        if since:
+            start = local_day_ts(since)
+            where.append(f"author_ts >= ? AND {LOCAL_TS} >= ?")
+            parameters += [start - MAX_TZ_OFFSET, start]
+        if until:
+            end = local_day_ts(until) + 86400
+            where.append(f"author_ts < ? AND {LOCAL_TS} < ?")
+            parameters += [end + MAX_TZ_OFFSET, end]
+        return " AND ".join(where), parameters
+
+    @classmethod
+    def rollup_filter(cls, project, repo=None, since=None, until=None):
+        where, parameters = cls.repo_filter(project, repo)
+        day_where, day_parameters = cls.day_filter(since, until)
+        return f"{where} AND {day_where}", [*parameters, *day_parameters]
+
+    def week_histogram(self, project, repo=None, since=None, until=None) -> list:
+        # Rows of (repo, ISO year, week, count). The week rollup can not be cut
+        # at a day, a date range is summed from the day rollup
+        if since or until:
+            where, parameters = self.rollup_filter(project, repo, since, until)
+            return self.connection.execute(
+                f"SELECT repo, {iso_year(DAY_TS)} AS year, {iso_week(DAY_TS)} AS week, "
+                f"SUM(commits) FROM repo_day WHERE {where} GROUP BY repo, year, week",
+                parameters,
+            ).fetchall()
+        where, parameters = self.repo_filter(project, repo)
+        return self.connection.execute(
+            f"SELECT repo, year, week, commits FROM repo_week WHERE {where}", parameters
+        ).fetchall()
+
+    def day_histogram(self, project, repo=None, since=None, until=None) -> list:
+        where, parameters = self.rollup_filter(project, repo, since, until)
+        return self.connection.execute(
+            f"SELECT repo, day, commits FROM repo_day WHERE {where}", parameters
+        ).fetchall()
+
+    def author_counts(self, project, repo=None, since=None, until=None) -> list:
+        where, parameters = self.rollup_filter(project, repo, since, until)
+        return self.connection.execute(
+            f"SELECT repo, author, SUM(commits) FROM author_day WHERE {where} GROUP BY repo, author",
+            parameters,
+        ).fetchall()
+
+    @staticmethod
+    def day_filter(since=None, until=None):
+        # Days are ISO dates, so they compare as text
+        where, parameters = ["1"], []
+        if since:
+            where.append("day >= ?")
+            parameters.append(since)
+        if until:
+            where.append("day <= ?")
+            parameters.append(until)
+        return " AND ".join(where), parameters
+
+    def project_weeks(self, since=None, until=None) -> list:
+        # Whole weeks, those the since and until dates fall in included
+        where, parameters = ["1"], []
+        if since:
+            where.append("year * 100 + week >= ?")
+            parameters.append(iso_week_key(since))
+        if until:
+            where.append("year * 100 + week <= ?")
+            parameters.append(iso_week_key(until))
+        return self.connection.execute(
+            "SELECT project, year, week, SUM(commits) FROM repo_week "
+            f"WHERE {' AND '.join(where)} GROUP BY project, year, week ORDER BY year, week",
+            parameters,
+        ).fetchall()
+
+    def project_days(self, since=None, until=None) -> list:
+        where, parameters = self.day_filter(since, until)
+        return self.connection.execute(
+            f"SELECT project, day, SUM(commits) FROM repo_day WHERE {where} "
+            "GROUP BY project, day ORDER BY day",
+            parameters,
+        ).fetchall()
+
+    def author_totals(self, since=None, until=None) -> list:
+        where, parameters = self.day_filter(since, until)
+        return self.connection.execute(
+            "SELECT author, SUM(commits), COUNT(DISTINCT project || '/' || repo), "
+            f"MIN(day), MAX(day) FROM author_day WHERE {where} GROUP BY author",
+            parameters,
+        ).fetchall()
+
+    def author_days(self, author, since=None, until=None) -> list:
+        where, parameters = self.day_filter(since, until)
+        return self.connection.execute(
+            f"SELECT project, repo, day, commits FROM author_day WHERE author = ? AND {where} "
+            "ORDER BY day",
+            [author, *parameters],
+        ).fetchall()
+
+    def get_cache_entry(self, project, name):
+        row = self.connection.execute(
+            "SELECT updated, data FROM cache WHERE project = ? AND name = ?",
+            (project, name),
+        ).fetchone()
+        return (row[0], pickle.loads(row[1])) if row else (None, None)
+
+    def save_cache_entry(self, project, name, data):
+        with self.connection as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (project, name, time.time(), pickle.dumps(data)),
+            )
+
+    def save_job(self, job, keep=None):
+        with self.connection as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO refresh_jobs VALUES (?, ?, ?)",
+                (job["id"], time.time(), json.dumps(job, default=str)),
+            )
+            if keep:
+                connection.execute(
+                    "DELETE FROM refresh_jobs WHERE id NOT IN "
+                    "(SELECT id FROM refresh_jobs ORDER BY updated DESC LIMIT ?)",
+                    (keep,),
+                )
+
+    def get_job(self, job_id):
+        row = self.connection.execute(
+            "SELECT data FROM refresh_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_jobs(self) -> list:
+        rows = self.connection.execute("SELECT data FROM refresh_jobs ORDER BY updated")
+        return [json.loads(data) for (data,) in rows]
@@ -1,5 +1,6 @@
 import datetime
 import os
+import re
 
 from lib import GitRepoCloneAndPull
 
@@ -9,6 +10,12 @@ class GitProjectInfo:
         self.projects = projects
         self.basedir = basedir
         self.github_org = github_org
+        # The project list only changes with the config, so lookups are built once
+        self.project_map = {project["name"]: project for project in projects}
+        self.project_expressions = [project["expression"] for project in projects]
+        self.compiled_expressions = {
+            project["name"]: re.compile(project["expression"]) for project in projects
+        }
 
     @staticmethod
     def convert_timestamp(timestamp):
@@ -18,10 +25,10 @@ class GitProjectInfo:
             return "Never"
 
     def get_project_info(self, project):
-        for project_info in self.projects:
-            if project_info["name"] == project:
-                return project_info
-        return None
+        return self.project_map.get(project)
+
+    def get_project_expression(self, project):
+        return self.compiled_expressions[project]
 
     def get_all_project_info(self):
         result = {"github_org": self.github_org, "projects": ""}
@@ -46,9 +53,7 @@ class GitProjectInfo:
         )
 
     def get_unmatched_repos(self, gcap):
-        repo_expressions = [project["expression"] for project in self.projects]
-        repo_list = gcap.unmatched_repos(repo_expressions)
-        return repo_list
+        return gcap.unmatched_repos(self.project_expressions)
 
     @staticmethod
     def get_clone_url(project, github_org):
@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+import traceback
+import uuid
+
+
+class GitRefreshScheduler:
+    FINISHED_JOBS_KEPT = 100
+    SCHEDULE_CHECK_INTERVAL = 30
+
+    def __init__(self, refresh_function, workers=1, job_store=None, schedule_lock=None):
+        # refresh_function(project, progress) does the actual refresh and returns
+        # a result that is stored on the job, progress(done, total) reports on it
+        self.refresh_function = refresh_function
+        self.workers = workers
+        # Jobs are also written to the job store, so any web worker process can
+        # report on a job another one runs
+        self.job_store = job_store
+        # Of all processes sharing the schedule lock, only the one holding it
+        # submits the scheduled refreshes, another takes over when it exits
+        self.schedule_lock = schedule_lock
+        self.jobs = {}
+        self.project_jobs = {}
+        self.schedules = {}
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        for n in range(self.workers):
+            threading.Thread(target=self.run_jobs, daemon=True).start()
+        threading.Thread(target=self.run_schedules, daemon=True).start()
+
+    def publish(self, job):
+        # The job goes on when the job store can not be written, the other
+        # processes just see it later
+        if self.job_store:
+            try:
+                self.job_store.save_job(dict(job), self.FINISHED_JOBS_KEPT)
+            except Exception as e:
+                print(f"Error publishing job {job['id']} of {job['project']}: {e}")
+
+    def schedule(self, project, interval_minutes):
+        with self.lock:
+            self.schedules[project] = {
+                "interval": interval_minutes * 60,
+                "next_run": time.time() + interval_minutes * 60,
+            }
+
+    def submit(self, project) -> dict:
+        with self.lock:
+            # A refresh that is still queued or running covers this request as well
+            job_id = self.project_jobs.get(project)
+            if job_id:
+                return dict(self.jobs[job_id])
+            job = {
+                "id": uuid.uuid4().hex,
+                "project": project,
+                "status": "queued",
+                "progress": {"done": 0, "total": None},
+                "created": time.time(),
+                "started": None,
+                "finished": None,
+                "result": None,
+                "error": None,
+            }
+            self.jobs[job["id"]] = job
+            self.project_jobs[project] = job["id"]
+            self.queue.put(job["id"])
+            self.prune_jobs()
+            self.publish(job)
+            return dict(job)
+
+    def get_job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job)
+        return self.job_store.get_job(job_id) if self.job_store else None
+
+    def get_jobs(self) -> list:
+        if self.job_store:
+            return self.job_store.get_jobs()
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def prune_jobs(self):
+        finished = [job for job in self.jobs.values() if job["finished"]]
+        finished.sort(key=lambda job: job["finished"])
+        for job in finished[: max(len(finished) - self.FINISHED_JOBS_KEPT, 0)]:
+            del self.jobs[job["id"]]
+
+    def update_progress(self, job, done, total):
+        with self.lock:
+            job["progress"] = {"done": done, "total": total}
+            self.publish(job)
+
+    def run_jobs(self):
+        # A worker thread that dies would leave its jobs queued forever
+        while True:
+            job_id = self.queue.get()
+            try:
+                self.run_job(job_id)
+            except Exception:
+                traceback.print_exc()
+
+    def run_job(self, job_id):
+        with self.lock:
+            job = self.jobs[job_id]
+            job["status"] = "running"
+            job["started"] = time.time()
+            self.publish(job)
+        try:
+            result = self.refresh_function(
+                job["project"],
+                lambda done, total: self.update_progress(job, done, total),
+            )
+            status, error = "success", None
+        except Exception as e:
+            traceback.print_exc()
+            result, status, error = None, "failed", str(e)
+        with self.lock:
+            job["status"] = status
+            job["result"] = result
+            job["error"] = error
+            job["finished"] = time.time()
+            del self.project_jobs[job["project"]]
+            self.publish(job)
+
+    def run_schedules(self):
+        holds_lock = not self.schedule_lock
+        while True:
+            try:
+                holds_lock = holds_lock or self.schedule_lock.acquire(blocking=False)
+                if holds_lock:
+                    self.submit_due()
+            except Exception:
+                traceback.print_exc()
+            time.sleep(self.SCHEDULE_CHECK_INTERVAL)
+
+    def submit_due(self):
+        now = time.time()
+        with self.lock:
+            due = [
+                project
+                for project, schedule in self.schedules.items()
+                if schedule["next_run"] <= now
+            ]
+            for project in due:
+                self.schedules[project]["next_run"] = now + self.schedules[project]["interval"]
+        for project in due:
+            print(f"Scheduled refresh of {project}")
+            self.submit(project)
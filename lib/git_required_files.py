@@ -0,0 +1,71 @@
+import re
+
+from git import GitCommandError
+
+
+class GitRequiredFiles:
+    LATEST_TAG = "latest_tag"
+
+    def __init__(self, log_reader, required_files, ref="HEAD", depth=1):
+        # required_files maps a label to the expression a path has to match.
+        # depth limits how deep into the tree paths are looked at, 0 is no limit
+        self.log_reader = log_reader
+        self.regexes = {
+            label: re.compile(expression) for label, expression in required_files.items()
+        }
+        # Paths that match none of the expressions are ruled out in one pass
+        self.combined = re.compile(
+            "|".join(f"(?:{expression})" for expression in required_files.values())
+        )
+        self.ref = ref
+        self.depth = depth
+
+    def get_latest_tag(self, repo_dir):
+        output = self.log_reader.run(
+            repo_dir,
+            "for-each-ref",
+            "--sort=-creatordate",
+            "--count=1",
+            "--format=%(refname)",
+            "refs/tags",
+        )
+        return output.strip() or None
+
+    def resolve_ref(self, repo_dir):
+        if self.ref == self.LATEST_TAG:
+            return self.get_latest_tag(repo_dir)
+        return self.ref
+
+    def list_paths(self, repo_dir, ref) -> list:
+        # Reads the tree straight from the object database, so this works
+        # on bare repos and does not depend on what is checked out
+        args = ["ls-tree", "--name-only", "-z"]
+        if self.depth != 1:
+            args += ["-r", "-t"]
+        output = self.log_reader.run(repo_dir, *args, ref)
+        paths = [path for path in output.split("\0") if path]
+        if self.depth > 1:
+            paths = [path for path in paths if path.count("/") < self.depth]
+        return paths
+
+    def check(self, repo_dir) -> dict:
+        ref = self.resolve_ref(repo_dir)
+        found = set()
+        if ref:
+            try:
+                paths = self.list_paths(repo_dir, f"{ref}^{{tree}}")
+            except GitCommandError as e:
+                print(f"Could not list {ref} of {repo_dir}: {e}")
+                paths = []
+            for path in paths:
+                if len(found) == len(self.regexes):
+                    break
+                if not self.combined.match(path):
+                    continue
+                for label, regex in self.regexes.items():
+                    if label not in found and regex.match(path):
+                        found.add(label)
+        result = {label: label in found for label in self.regexes}
+        result["required_files"] = len(found)
+        result["ref"] = ref
+        return result
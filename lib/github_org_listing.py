@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+
+from lib import STAGE_TIMES, FileLock
+
+OrgRepo = namedtuple("OrgRepo", ["name", "clone_url"])
+
+
+class GitHubOrgListing:
+    API_URL = "https://api.github.com"
+    PAGE_SIZE = 100
+
+    def __init__(
+        self,
+        github_access_token,
+        github_org,
+        snapshot_file=None,
+        ttl=3600,
+        api_url=API_URL,
+    ):
+        self.github_access_token = github_access_token
+        self.github_org = github_org
+        self.snapshot_file = snapshot_file
+        self.ttl = ttl
+        self.api_url = api_url.rstrip("/")
+        # Nothing is fetched or read until the repos are first asked for
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def load_snapshot(self):
+        if self.snapshot_file and os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file) as f:
+                return json.load(f)
+        else:
+            return None
+
+    def save_snapshot(self, snapshot):
+        if not self.snapshot_file:
+            return
+        snapshot_dir = os.path.dirname(os.path.abspath(self.snapshot_file))
+        os.makedirs(snapshot_dir, exist_ok=True)
+        fd, temp_file = tempfile.mkstemp(dir=snapshot_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(temp_file, self.snapshot_file)
+
+    def fetch_page(self, page, etag=None):
+        # Returns the etag and repos of a page, or None for the repos when
+        # GitHub answers the conditional request with 304 Not Modified
+        request = urllib.request.Request(
+            f"{self.api_url}/orgs/{self.github_org}/repos?per_page={self.PAGE_SIZE}&page={page}",
+            headers={
+                "Accept": "application/vnd.github+json",
+                "Authorization": f"token {self.github_access_token}",
+            },
+        )
+        if etag:
+            request.add_header("If-None-Match", etag)
+        try:
+            with urllib.request.urlopen(request) as response:
+                repos = [
+                    [repo["name"], repo["clone_url"]] for repo in json.load(response)
+                ]
+                return response.headers.get("ETag"), repos
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return etag, None
+            raise e
+
+    def refresh(self, snapshot):
+        old_pages = snapshot["pages"] if snapshot else []
+        pages = []
+        page = 1
+        while True:
+            old_page = old_pages[page - 1] if page <= len(old_pages) else None
+            etag, repos = self.fetch_page(page, old_page["etag"] if old_page else None)
+            if repos is None:
+                repos = old_page["repos"]
+            pages.append({"etag": etag, "repos": repos})
+            # A page that is not full is the last one
+            if len(repos) < self.PAGE_SIZE:
+                break
+            page += 1
+        changed = [page["repos"] for page in pages] != [
+            page["repos"] for page in old_pages
+        ]
+        return {
+            "fetched": time.time(),
+            "updated": time.time() if changed or not snapshot else snapshot["updated"],
+            "pages": pages,
+        }
+
+    def expired(self):
+        return not self.snapshot or time.time() - self.snapshot["fetched"] > self.ttl
+
+    def get_snapshot(self, allow_stale=False):
+        with self.lock:
+            if self.expired():
+                # Another process sharing the snapshot file may have listed the org
+                self.snapshot = self.load_snapshot() or self.snapshot
+            if self.expired() and not (allow_stale and self.snapshot):
+                if self.snapshot_file:
+                    with FileLock(f"{self.snapshot_file}.lock"):
+                        self.snapshot = self.load_snapshot() or self.snapshot
+                        if self.expired():
+                            self.refresh_snapshot()
+                else:
+                    self.refresh_snapshot()
+            return self.snapshot
+
+    def refresh_snapshot(self):
+        print(f"Listing the repos of {self.github_org}")
+        try:
+            with STAGE_TIMES.stage("github_listing", org=self.github_org):
+                self.snapshot = self.refresh(self.snapshot)
+            self.save_snapshot(self.snapshot)
+        except urllib.error.URLError as e:
+            if not self.snapshot:
+                raise e
+            print(f"Error listing repos, using the listing of before: {e}")
+
+    def get_repos(self, allow_stale=False) -> list:
+        snapshot = self.get_snapshot(allow_stale)
+        return [
+            OrgRepo(name, clone_url)
+            for page in snapshot["pages"]
+            for name, clone_url in page["repos"]
+        ]
@@ -0,0 +1,70 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    def __init__(self, prefix="gitmeta"):
+        self.prefix = prefix
+        # (stage, labels) -> [count, total seconds, max seconds]
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **labels)
+
+    def record(self, name, seconds, **labels):
+        # Labels without a value are left out, the rest are kept as text so the
+        # stages always sort
+        labels = {label: str(value) for label, value in labels.items() if value is not None}
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            stats = self.stages.setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def get_stats(self) -> list:
+        with self.lock:
+            return [
+                {"stage": name, **dict(labels), "count": count, "seconds": total, "max_seconds": longest}
+                for (name, labels), (count, total, longest) in self.stages.items()
+            ]
+
+    @staticmethod
+    def format_labels(labels):
+        escaped = [
+            (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+            for key, value in labels
+        ]
+        return ",".join(f'{key}="{value}"' for key, value in escaped)
+
+    def to_prometheus(self, **labels) -> str:
+        # Prometheus text exposition format, a summary without quantiles plus
+        # the slowest run of every stage. labels are added to every sample
+        common = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        metric = f"{self.prefix}_stage_seconds"
+        lines = [
+            f"# HELP {metric} Time spent per stage, repo and project.",
+            f"# TYPE {metric} summary",
+        ]
+        max_lines = [
+            f"# HELP {metric}_max Slowest single run per stage, repo and project.",
+            f"# TYPE {metric}_max gauge",
+        ]
+        with self.lock:
+            for (name, stage_labels), (count, total, longest) in sorted(self.stages.items()):
+                label_text = self.format_labels((("stage", name),) + stage_labels + common)
+                lines.append(f"{metric}_count{{{label_text}}} {count}")
+                lines.append(f"{metric}_sum{{{label_text}}} {total:.6f}")
+                max_lines.append(f"{metric}_max{{{label_text}}} {longest:.6f}")
+        return "\n".join(lines + max_lines) + "\n"
+
+
+# Shared by the lib classes, so the app can expose all stages in one place
+STAGE_TIMES = StageTimer()
@@ -0,0 +1,163 @@
+import datetime
+import os
+import subprocess
+from collections import Counter
+
+from benchmarks.synthetic_org import generate_repo
+from lib import GitCommitIndex, GitLogReader, GitMetricsStore
+
+PROJECT = "project"
+
+
+def git(repo_dir, *args, env=None):
+    return subprocess.run(
+        ["git", "-C", repo_dir, *args],
+        capture_output=True,
+        check=True,
+        text=True,
+        env=env and {**os.environ, **env},
+    ).stdout
+
+
+def commit(repo_dir, date, author="student9"):
+    # An empty commit by a new author, authored and committed at date
+    identity = {
+        "GIT_AUTHOR_NAME": author,
+        "GIT_AUTHOR_EMAIL": f"{author}@example.com",
+        "GIT_AUTHOR_DATE": date,
+        "GIT_COMMITTER_NAME": author,
+        "GIT_COMMITTER_EMAIL": f"{author}@example.com",
+        "GIT_COMMITTER_DATE": date,
+    }
+    git(repo_dir, "commit", "-q", "--allow-empty", "-m", f"Commit at {date}", env=identity)
+
+
+def make_index(tmp_path):
+    metrics_store = GitMetricsStore(str(tmp_path / "metrics.sqlite"))
+    return GitCommitIndex(GitLogReader(), metrics_store), metrics_store
+
+
+def make_repo(tmp_path, name, commits=200):
+    return generate_repo(str(tmp_path / name), commits, tags=2, branches=2)
+
+
+def assert_indexed(metrics_store, repo_dir):
+    repo = os.path.basename(repo_dir)
+    stored = {
+        sha
+        for sha, in metrics_store.connection.execute(
+            "SELECT sha FROM commits WHERE project = ? AND repo = ?", (PROJECT, repo)
+        )
+    }
+    assert stored == set(git(repo_dir, "rev-list", "--all").split())
+    assert_rollups(metrics_store, repo_dir)
+
+
+def assert_rollups(metrics_store, repo_dir):
+    # Every rollup counts the commits of git log by the author's local date
+    repo = os.path.basename(repo_dir)
+    log = git(repo_dir, "log", "--all", "--format=%aI %ae")
+    commits = [
+        (datetime.datetime.fromisoformat(date).date(), author)
+        for date, author in (line.split(" ") for line in log.splitlines())
+    ]
+    expected = {
+        "repo_day": Counter((day.isoformat(),) for day, _ in commits),
+        "author_day": Counter((author, day.isoformat()) for day, author in commits),
+        "repo_week": Counter(tuple(day.isocalendar()[:2]) for day, _ in commits),
+    }
+    for table, columns in metrics_store.ROLLUPS.items():
+        rows = metrics_store.connection.execute(
+            f"SELECT {', '.join(columns)}, commits FROM {table} WHERE project = ? AND repo = ?",
+            (PROJECT, repo),
+        )
+        assert {tuple(row[:-1]): row[-1] for row in rows} == expected[table], table
+
+
+def sync(commit_index, repo_dir):
+    commit_index.sync_repo(PROJECT, os.path.basename(repo_dir), repo_dir)
+
+
+def test_new_commits_are_added(tmp_path):
+    commit_index, metrics_store = make_index(tmp_path)
+    repo_dir = make_repo(tmp_path, "project-team000")
+    sync(commit_index, repo_dir)
+    assert_indexed(metrics_store, repo_dir)
+
+    commit(repo_dir, "2023-10-02T23:30:00+02:00")
+    commit(repo_dir, "2023-10-03T01:15:00-05:00")
+    sync(commit_index, repo_dir)
+    assert_indexed(metrics_store, repo_dir)
+
+
+def test_new_refs_on_indexed_commits(tmp_path):
+    commit_index, metrics_store = make_index(tmp_path)
+    repo_dir = make_repo(tmp_path, "project-team000")
+    sync(commit_index, repo_dir)
+
+    git(repo_dir, "tag", "extra", "main~5")
+    git(repo_dir, "branch", "side", "main~10")
+    sync(commit_index, repo_dir)
+    assert_indexed(metrics_store, repo_dir)
+    assert "refs/tags/extra" in metrics_store.get_repo_tips(PROJECT, "project-team000")
+
+
+def test_rewritten_history(tmp_path):
+    commit_index, metrics_store = make_index(tmp_path)
+    repo_dir = make_repo(tmp_path, "project-team000")
+    sync(commit_index, repo_dir)
+
+    # Only main is left, three commits shorter and with the old ones pruned
+    for ref in git(repo_dir, "for-each-ref", "--format=%(refname)").split():
+        if ref != "refs/heads/main":
+            git(repo_dir, "update-ref", "-d", ref)
+    git(repo_dir, "reset", "-q", "--hard", "main~3")
+    git(repo_dir, "reflog", "expire", "--expire=now", "--all")
+    git(repo_dir, "gc", "-q", "--prune=now")
+    commit(repo_dir, "2023-11-20T10:00:00+00:00")
+    sync(commit_index, repo_dir)
+    assert_indexed(metrics_store, repo_dir)
+
+
+def test_merge(tmp_path):
+    commit_index, metrics_store = make_index(tmp_path)
+    repo_dir = make_repo(tmp_path, "project-team000")
+    sync(commit_index, repo_dir)
+
+    git(repo_dir, "checkout", "-q", "-b", "topic", "main~2")
+    commit(repo_dir, "2023-12-01T09:00:00+05:30")
+    git(repo_dir, "checkout", "-q", "main")
+    git(
+        repo_dir,
+        "merge",
+        "-q",
+        "--no-ff",
+        "-m",
+        "Merge topic",
+        "topic",
+        env={
+            "GIT_AUTHOR_NAME": "student8",
+            "GIT_AUTHOR_EMAIL": "student8@example.com",
+            "GIT_AUTHOR_DATE": "2023-12-01T12:00:00-05:00",
+            "GIT_COMMITTER_NAME": "student8",
+            "GIT_COMMITTER_EMAIL": "student8@example.com",
+        },
+    )
+    sync(commit_index, repo_dir)
+    assert_indexed(metrics_store, repo_dir)
+
+
+def test_removed_repo(tmp_path):
+    commit_index, metrics_store = make_index(tmp_path)
+    kept = make_repo(tmp_path, "project-team000")
+    removed = make_repo(tmp_path, "project-team001", commits=50)
+    sync(commit_index, kept)
+    sync(commit_index, removed)
+
+    metrics_store.remove_other_repos(PROJECT, ["project-team000"])
+    assert_indexed(metrics_store, kept)
+    assert metrics_store.get_repo_tips(PROJECT, "project-team001") is None
+    for table in ["commits", *metrics_store.ROLLUPS]:
+        assert not metrics_store.connection.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE repo = ?", ("project-team001",)
+        ).fetchone()[0]
@@ -0,0 +1,36 @@
+import sqlite3
+import time
+
+from lib import GitRefreshScheduler
+
+
+class BrokenJobStore:
+    def save_job(self, job, finished_kept):
+        raise sqlite3.OperationalError("unable to open database file")
+
+
+def wait_for(scheduler, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = scheduler.get_job(job_id)
+        if job["finished"]:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_jobs_run_when_they_can_not_be_published():
+    refreshed = []
+    scheduler = GitRefreshScheduler(
+        lambda project, progress: refreshed.append(project) or len(refreshed),
+        job_store=BrokenJobStore(),
+    )
+    scheduler.start()
+
+    first = scheduler.submit("project")
+    assert wait_for(scheduler, first["id"])["status"] == "success"
+    # The project is free for the next refresh, and the worker is still there
+    second = scheduler.submit("project")
+    assert second["id"] != first["id"]
+    assert wait_for(scheduler, second["id"])["result"] == 2
+    assert refreshed == ["project", "project"]
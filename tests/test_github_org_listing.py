@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import create_app
+from lib import GitHubOrgListing, OrgRepo
+
+
+class GitHubStub(BaseHTTPRequestHandler):
+    # The repos listing of one org, with an ETag per page
+    repos = [
+        {"name": f"org-team{n:03d}", "clone_url": f"https://github.com/org/org-team{n:03d}.git"}
+        for n in range(150)
+    ]
+    requests = []
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        page, per_page = int(query["page"][0]), int(query["per_page"][0])
+        etag = f'"page-{page}"'
+        self.requests.append((url.path, page, self.headers.get("If-None-Match")))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(self.repos[(page - 1) * per_page : page * per_page]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def github_api():
+    GitHubStub.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GitHubStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_nothing_is_listed_at_startup(tmp_path, github_api):
+    settings = {
+        "github_access_token": "token",
+        "github_organization": "org",
+        "github_api_url": github_api,
+        "git_repo_dir": str(tmp_path),
+        "projects": [],
+    }
+    create_app(settings, start_scheduler=False)
+    GitHubOrgListing("token", "org", str(tmp_path / "snapshot.json"), api_url=github_api)
+    assert GitHubStub.requests == []
+
+
+def test_more_than_a_page_of_repos(tmp_path, github_api):
+    listing = GitHubOrgListing("token", "org", str(tmp_path / "snapshot.json"), api_url=github_api)
+
+    repos = listing.get_repos()
+    assert repos == [OrgRepo(repo["name"], repo["clone_url"]) for repo in GitHubStub.repos]
+    assert GitHubStub.requests == [("/orgs/org/repos", 1, None), ("/orgs/org/repos", 2, None)]
+
+    # Another process finds the listing in the snapshot file
+    other = GitHubOrgListing("token", "org", str(tmp_path / "snapshot.json"), api_url=github_api)
+    assert other.get_repos() == repos
+    assert len(GitHubStub.requests) == 2
+
+
+def test_expired_listing_is_revalidated_per_page(tmp_path, github_api):
+    listing = GitHubOrgListing(
+        "token", "org", str(tmp_path / "snapshot.json"), ttl=0, api_url=github_api
+    )
+    repos = listing.get_repos()
+    updated = listing.snapshot["updated"]
+
+    time.sleep(0.01)
+    assert listing.get_repos() == repos
+    assert GitHubStub.requests[2:] == [
+        ("/orgs/org/repos", 1, '"page-1"'),
+        ("/orgs/org/repos", 2, '"page-2"'),
+    ]
+    # Nothing changed, so the repo dirs do not need to be rescanned
+    assert listing.snapshot["updated"] == updated
+    assert listing.snapshot["fetched"] > updated
@@ -0,0 +1,29 @@
+from app import create_app
+from lib import StageTimer
+
+
+def test_labels_without_a_value_still_sort():
+    timer = StageTimer()
+    timer.record("request", 0.1, endpoint="gitmeta.get_commit_number")
+    timer.record("request", 0.2, endpoint=None)
+    timer.record("request", 0.3, endpoint=3)
+
+    text = timer.to_prometheus()
+    assert 'gitmeta_stage_seconds_count{stage="request"} 1' in text
+    assert 'gitmeta_stage_seconds_count{stage="request",endpoint="3"} 1' in text
+
+
+def test_metrics_after_an_unmatched_request(tmp_path):
+    settings = {
+        "github_access_token": "token",
+        "github_organization": "org",
+        "git_repo_dir": str(tmp_path),
+        "projects": [],
+    }
+    client = create_app(settings, start_scheduler=False).test_client()
+    assert client.get("/cache_stats").status_code == 200
+    assert client.get("/no_such_page").status_code == 404
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'endpoint="unmatched"' in response.get_data(as_text=True)
@@ -0,0 +1,5 @@
+from app import create_app
+
+# For a multi process WSGI server, e.g. gunicorn --workers 4 wsgi:application.
+# Not with --preload, every worker has to start its own refresh threads
+application = create_app()